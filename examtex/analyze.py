@@ -8,12 +8,14 @@ import sys
 import math
 import argparse
 import csv
+from examtex.itemstats import kr20
 
 "Create and configure the command-line argument parser"
 parser = argparse.ArgumentParser(description='Exam Result Normalizer')
 parser.add_argument('infile', type=argparse.FileType('r'),
                     help='Exam result file (csv format)')
 parser.add_argument('--plot', action='store_true', help='Plot stuff!')
+parser.add_argument('--save', help='Save the plot to this file (png, pdf, ...) instead of showing it')
 parser.add_argument('--nskip', type=int, default=0, help='Number to skip')
 args = parser.parse_args()
 
@@ -211,7 +213,7 @@ for q, qn in enumerate(q_list):
 print('------------------------------------------------------------------------------------------')
 
 "Calc the rest"
-r20 = (n_q/(n_q-1))*(1-pq/sig**2)
+r20 = kr20(n_q, pq, sig**2)
 stderr = sig*math.sqrt(1-r20)
 range_s = max_s - min_s
 range_sig = range_s/sig
@@ -225,40 +227,20 @@ print('Range = [{} - {}] = {} = {:4.2f} stderrs'.format(max_s, min_s, range_s, r
 print('KR20 = {:5.3f}'.format(r20))
 
 
-if args.plot:
-    import numpy as np
-    import seaborn as sns
-    import matplotlib.pyplot as plt
+if args.plot or args.save:
+    from examtex.plot import score_summary, plot_scores
 
     name = args.infile.name.split('/')[-1]
-    lab = "{} Questions, {} Students".format(n_q, n_s)
-
-    q1 = np.percentile(scores, 25)
-    q2 = np.percentile(scores, 50)
-    q3 = np.percentile(scores, 75)
-
-    b0 = -0.5
-    bins = []
-    for i in range(n_q+2):
-        b = b0 + i
-        bins.append(b)
-
-    sns.set(style="ticks")
-
-    f, (ax_hist, ax_box) = plt.subplots(nrows=2, sharex='col',
-                                        gridspec_kw={"height_ratios": (.9, .1)})
-
-    sns.boxplot(x=scores, ax=ax_box, showmeans=True, notch=True, orient="h")
-    sns.histplot(scores, bins=bins, ax=ax_hist, stat='density', kde=True, label=lab)
-
-    ax_hist.set(xlim=[-0.5, n_q+0.5])
-    ax_box.set(yticks=[])
-    ax_hist.axvline(x=avg, alpha=0.3, color='red')
-    ax_hist.axvspan(avg-0.5*stderr, avg+0.5*stderr, alpha=0.15, color='red')
-    ax_hist.grid()
-    ax_box.grid()
-    plt.subplots_adjust(wspace=0, hspace=0)
-
-    ax_hist.legend()
-    f.suptitle(name)
-    plt.show()
+    summary = score_summary(q_list, students)
+
+    if args.save:
+        "Write the plot to a file, no display needed"
+        from matplotlib.figure import Figure
+        fig = Figure()
+        plot_scores(fig, name, n_q, summary)
+        fig.savefig(args.save)
+    else:
+        import matplotlib.pyplot as plt
+        fig = plt.figure()
+        plot_scores(fig, name, n_q, summary)
+        plt.show()
@@ -0,0 +1,361 @@
+#!/usr/bin/env python
+"""
+Assemble an exam from the question bank, using the item statistics database.
+
+Each candidate question is a file `<question_dir>/q<qid>.py` with statistics in the database. The
+topics of a question are taken from the `Outcomes:` line of its meta information (comma separated).
+
+The predicted reliability of a set of k questions uses the item-total correlations r_i and the item
+standard deviations s_i = sqrt(d_i(1-d_i)): the standard deviation of the total score is sum(r_i s_i),
+so the predicted KR-20 is
+
+    KR20 = k/(k-1) * (1 - sum(s_i^2)/sum(r_i s_i)^2)
+
+The selection is done in three steps:
+    - topic coverage: for each required topic, add the most discriminating questions covering it
+    - greedy fill: add the most discriminating question, penalized by its distance from the
+      difficulty needed to bring the mean difficulty to the target
+    - local search: swap a selected question for a candidate while that improves the objective,
+      which is the predicted KR-20 penalized by the distance of the mean difficulty from the target,
+      and heavily penalized by any shortfall from the minimum KR-20, so feasible swaps are preferred
+
+Each step is vectorized over the candidates, so the cost is linear in the size of the bank.
+
+Each selected question is written with the question version that has the most responses in the
+database, and with an identity permutation for the number of choices it renders with.
+
+"""
+import os
+import re
+import numpy as np
+from examtex.util import QuestionFactory
+from examtex.itemstats import SUMS
+
+OUTCOMES = re.compile(r'Outcomes:\s*(.*)')
+CHOICE = re.compile(r'\\(correct)?choice\b')
+
+"Penalty per unit of predicted KR-20 below the minimum"
+INFEASIBLE = 10.0
+
+
+def question_topics(question_dir, qid):
+    """
+    Get the topics of a question from the `Outcomes:` line of the question file, without running it.
+
+    :param question_dir: path to directory containing question files
+    :type question_dir: str
+    :param qid: id of question
+    :type qid: str
+    :return: the topics
+    :rtype: set of strs
+
+    """
+    with open(os.path.join(question_dir, 'q{}.py'.format(qid)), 'r') as f:
+        m = OUTCOMES.search(f.read())
+    if not m:
+        return set()
+    return {t.strip() for t in m.group(1).split(',') if t.strip()}
+
+
+def find_questions(question_dir):
+    """
+    Get the ids of all the questions in the question directory.
+
+    :param question_dir: path to directory containing question files
+    :type question_dir: str
+    :return: the question ids
+    :rtype: list of strs
+
+    """
+    return sorted(f[1:-3] for f in os.listdir(question_dir) if f.startswith('q') and f.endswith('.py'))
+
+
+def predicted_kr20(k, sum_a, sum_v):
+    """
+    Predicted KR-20 of a set of questions.
+
+    :param k: number of questions
+    :type k: int
+    :param sum_a: sum of r_i s_i
+    :type sum_a: float or array
+    :param sum_v: sum of s_i^2
+    :type sum_v: float or array
+    :return: the predicted KR-20
+    :rtype: float or array
+
+    """
+    if k < 2:
+        return np.zeros_like(sum_a)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        kr20 = (k/(k - 1))*(1 - sum_v/sum_a**2)
+    return np.where(sum_a > 0, kr20, -np.inf)
+
+
+class Assembler(object):
+    """
+    Select questions meeting difficulty, reliability and topic coverage targets.
+
+    :param qids: the candidate questions
+    :type qids: list of strs
+    :param d: the difficulty (fraction correct) of each candidate
+    :type d: list of floats
+    :param r: the point-biserial correlation of each candidate
+    :type r: list of floats
+    :param topics: the topics of each candidate, optional
+    :type topics: list of sets or None
+    :param weight: the weight of the difficulty penalty
+    :type weight: float
+
+    """
+
+    def __init__(self, qids, d, r, topics=None, weight=1.0):
+        self.qids = list(qids)
+        self.d = np.asarray(d, dtype=float)
+        self.r = np.asarray(r, dtype=float)
+        self.s = np.sqrt(self.d*(1 - self.d))
+        self.a = self.r*self.s
+        self.v = self.s**2
+        self.topics = topics or [set() for _ in self.qids]
+        self.weight = weight
+
+    def objective(self, k, sum_a, sum_v, sum_d, target, min_kr20=None):
+        kr20 = predicted_kr20(k, sum_a, sum_v)
+        obj = kr20 - self.weight*np.abs(sum_d/k - target)
+        if min_kr20 is not None:
+            obj = obj - INFEASIBLE*np.maximum(min_kr20 - kr20, 0)
+        return obj
+
+    def select(self, n, target, cover=None, min_kr20=None, max_passes=20):
+        """
+        Select the questions.
+
+        :param n: number of questions
+        :type n: int
+        :param target: target mean difficulty
+        :type target: float
+        :param cover: minimum number of questions for each required topic, optional
+        :type cover: dict or None
+        :param min_kr20: minimum predicted KR-20, optional
+        :type min_kr20: float or None
+        :param max_passes: maximum number of local search passes
+        :type max_passes: int
+        :return: the indices of the selected candidates
+        :rtype: list of ints
+
+        """
+        cover = cover or {}
+        n = min(n, len(self.qids))
+        req = list(cover)
+        has = np.array([[t in ts for t in req] for ts in self.topics], dtype=bool).reshape(len(self.qids), len(req))
+        need = np.array([cover[t] for t in req], dtype=int)
+
+        free = np.ones(len(self.qids), dtype=bool)
+        chosen = []
+
+        def take(i):
+            free[i] = False
+            chosen.append(i)
+
+        "Topic coverage, starting with the topics with the fewest candidates"
+        for t in np.argsort(has.sum(axis=0)):
+            while len(chosen) < n and has[chosen, t].sum() < need[t]:
+                cand = np.flatnonzero(free & has[:, t])
+                if not len(cand):
+                    break
+                take(cand[np.argmax(self.a[cand])])
+
+        "Greedy fill"
+        while len(chosen) < n:
+            want = (n*target - self.d[chosen].sum())/(n - len(chosen))
+            score = np.where(free, self.a - self.weight*np.abs(self.d - want), -np.inf)
+            take(int(np.argmax(score)))
+
+        "Local search"
+        k = len(chosen)
+        for _ in range(max_passes if k > 1 else 0):
+            sum_a = self.a[chosen].sum()
+            sum_v = self.v[chosen].sum()
+            sum_d = self.d[chosen].sum()
+            best = self.objective(k, sum_a, sum_v, sum_d, target, min_kr20)
+            counts = has[chosen].sum(axis=0)
+            swap = None
+            for pos, i in enumerate(chosen):
+
+                "Topics at their minimum must be covered by the replacement"
+                locked = has[i] & (counts <= need)
+                ok = free & has[:, locked].all(axis=1)
+                obj = self.objective(k, sum_a - self.a[i] + self.a, sum_v - self.v[i] + self.v,
+                                     sum_d - self.d[i] + self.d, target, min_kr20)
+                obj = np.where(ok, obj, -np.inf)
+                j = int(np.argmax(obj))
+                if obj[j] > best + 1e-12:
+                    best, swap = obj[j], (pos, i, j)
+            if swap is None:
+                break
+            pos, i, j = swap
+            free[i] = True
+            free[j] = False
+            chosen[pos] = j
+
+        return chosen
+
+    def report(self, chosen, target, cover=None):
+        """
+        Summarize a selection, and check it against the targets.
+
+        :param chosen: the indices of the selected candidates
+        :type chosen: list of ints
+        :param target: target mean difficulty
+        :type target: float
+        :param cover: minimum number of questions for each required topic, optional
+        :type cover: dict or None
+        :return: number of questions, mean difficulty, predicted KR-20 and any uncovered topics
+        :rtype: dict
+
+        """
+        cover = cover or {}
+        k = len(chosen)
+        kr20 = float(predicted_kr20(k, self.a[chosen].sum(), self.v[chosen].sum()))
+        missing = {t: m for t, m in cover.items() if sum(t in self.topics[i] for i in chosen) < m}
+        return {'n': k, 'd': float(self.d[chosen].mean()) if k else 0.0, 'kr20': kr20, 'missing': missing}
+
+
+def count_choices(question_dir, qid, version=0, stats=None):
+    """
+    Get the number of choices of a multiple-choice question by rendering it. If the question can not
+    be rendered, the number of options chosen by any student in the statistics is used.
+
+    :param question_dir: path to directory containing question files
+    :type question_dir: str
+    :param qid: id of question
+    :type qid: str
+    :param version: the question version
+    :type version: int
+    :param stats: the statistics of the question (with the option counts n_a-e), optional
+    :type stats: dict or None
+    :return: the number of choices, 0 for a question without choices
+    :rtype: int
+
+    """
+    try:
+        tex = QuestionFactory(question_dir=question_dir).make_question(qid, version=version)
+        return len(CHOICE.findall(tex))
+    except Exception as err:
+        print('WARNING: Could not render question {} ({}), using the options chosen'.format(qid, err))
+        chosen = [i for i, k in enumerate(SUMS[1:6]) if stats and stats.get(k)]
+        return chosen[-1] + 1 if chosen else 0
+
+
+def exam_config(qids, version='A', pts=1, qversions=None, nchoices=None, **kwargs):
+    """
+    Create an exam configuration for the selected questions.
+
+    :param qids: the selected questions
+    :type qids: list of strs
+    :param version: name of the exam version
+    :type version: str
+    :param pts: the point value of each question
+    :type pts: int
+    :param qversions: the question version of each question, optional (0 if not given)
+    :type qversions: dict or None
+    :param nchoices: the number of choices of each question, optional (5 if not given)
+    :type nchoices: dict or None
+    :param kwargs: any other configuration (course, semester, exam, ...)
+    :type kwargs: dict
+    :return: the exam configuration
+    :rtype: dict
+
+    """
+    qversions = qversions or {}
+    nchoices = nchoices or {}
+    questions = []
+    for q in qids:
+        question = {'qid': q, 'pts': pts, 'version': qversions.get(q, 0)}
+        nchoice = nchoices.get(q, 5)
+        if nchoice:
+            question['perm'] = list(range(nchoice))
+        questions.append(question)
+    return {**kwargs, 'versions': [{'version': version, 'order': list(qids), 'questions': questions}]}
+
+
+if __name__ == "__main__":
+    import argparse
+    import inspect
+    import yaml
+    from examtex.itemstats import ItemStats
+    from examtex.config import load_yaml, validate_config
+
+    "Create the parser"
+    parser = argparse.ArgumentParser(description='Assemble an exam from the question bank')
+    parser.add_argument('db', help='Item statistics database file (sqlite)')
+    parser.add_argument('-n', type=int, required=True, help='Number of questions')
+    parser.add_argument('--config', help='Exam configuration file (YAML format)')
+    parser.add_argument('--question_dir', help='Question directory, overrides the configuration')
+    parser.add_argument('--difficulty', type=float, default=0.7, help='Target mean difficulty (fraction correct)')
+    parser.add_argument('--kr20', type=float, help='Minimum predicted KR-20')
+    parser.add_argument('--topics', nargs='*', default=[], help='Topics that must be covered')
+    parser.add_argument('--per_topic', type=int, default=1, help='Minimum number of questions per topic')
+    parser.add_argument('--min_n', type=int, default=30, help='Minimum number of responses for a question')
+    parser.add_argument('--weight', type=float, default=1.0, help='Weight of the difficulty penalty')
+    parser.add_argument('--course', help='The course')
+    parser.add_argument('--semester', help='The semester')
+    parser.add_argument('--exam', help='The exam')
+    parser.add_argument('--out', help='Exam configuration output file (YAML format), only written if the targets are met')
+    args = parser.parse_args()
+
+    "Get the question directory"
+    question_dir = args.question_dir
+    if not question_dir:
+        cfg_file = args.config
+        if not cfg_file:
+            cdir = os.path.dirname(os.path.abspath(inspect.stack()[0][1]))
+            cfg_file = "{}/../config.yml".format(cdir)
+        question_dir = load_yaml(cfg_file)['question_dir']
+
+    "Get the candidates: questions in the bank with enough statistics"
+    with ItemStats(args.db) as stats:
+        summary = stats.summary()
+    qids = [q for q in find_questions(question_dir) if q in summary and summary[q]['n'] >= args.min_n]
+    if not qids:
+        parser.error('No questions in {} have statistics'.format(question_dir))
+    topics = [question_topics(question_dir, q) for q in qids]
+
+    assembler = Assembler(qids, [summary[q]['d'] for q in qids], [summary[q]['r'] for q in qids],
+                          topics=topics, weight=args.weight)
+    cover = {t: args.per_topic for t in args.topics}
+    chosen = assembler.select(args.n, args.difficulty, cover, min_kr20=args.kr20)
+    result = assembler.report(chosen, args.difficulty, cover)
+
+    print('Selected {} of {} questions'.format(result['n'], len(qids)))
+    print('Mean difficulty = {:5.3f} (target {:5.3f})'.format(result['d'], args.difficulty))
+    print('Predicted KR20 = {:5.3f}'.format(result['kr20']))
+    failed = False
+    if args.kr20 is not None and result['kr20'] < args.kr20:
+        print('ERROR: Predicted KR20 is below {:5.3f}'.format(args.kr20))
+        failed = True
+    for t, m in result['missing'].items():
+        print('ERROR: Topic "{}" has fewer than {} questions'.format(t, m))
+        failed = True
+    if failed:
+        raise SystemExit(1)
+
+    "Use the question version with the most responses, and the number of choices it renders with"
+    selected = sorted(qids[i] for i in chosen)
+    qversions = {q: summary[q]['version'] for q in selected if summary[q]['version'] is not None}
+    nchoices = {q: count_choices(question_dir, q, qversions.get(q, 0), summary[q]) for q in selected}
+    exam_cfg = exam_config(selected, qversions=qversions, nchoices=nchoices,
+                           **{k: getattr(args, k) for k in ['course', 'semester', 'exam'] if getattr(args, k)})
+
+    "Check the questions of the new exam (the rest of the configuration is added later)"
+    errors = [e for e in validate_config({'question_dir': question_dir, **exam_cfg})
+              if not e.startswith('Configuration is missing')]
+    if errors:
+        for err in errors:
+            print('ERROR: {}'.format(err))
+        raise SystemExit(1)
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            yaml.safe_dump(exam_cfg, f, default_flow_style=None, sort_keys=False)
+    else:
+        print(yaml.safe_dump(exam_cfg, default_flow_style=None, sort_keys=False))
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+"""
+Screen normalized exam results for pairs of students with unusually many identical wrong answers.
+
+For every pair of students (i, j):
+    - shared: the number of questions both answered wrong with the same option
+    - expected: the number expected by chance, given that both answered wrong. If a fraction f_qo
+      of the wrong answers to question q chose option o, two wrong answers match with probability
+      m_q = sum_o f_qo^2, so expected = sum(m_q) over the questions both answered wrong
+    - z: (shared - expected)/sqrt(sum(m_q(1-m_q))), the pairs are ranked by this score
+
+The wrong answers are packed into bits (one bit per question and wrong option), so the shared count
+of a pair is the population count of the AND of two rows. The pairs are processed in blocks of rows
+against all later rows, vectorized, and the blocks can be split across a process pool. Only the
+top-k pairs of each block are kept.
+
+"""
+import heapq
+import numpy as np
+
+WRONG = ['2', '3', '4', '5']
+
+"Number of set bits in each byte"
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+"Arrays shared by the blocks, set in each process by init_worker"
+_data = {}
+
+
+def response_matrices(responses):
+    """
+    Create the matrices needed for the screening.
+
+    :param responses: the responses (students x questions), '1' is correct
+    :type responses: array of strs
+    :return: the packed wrong options, the wrong answer matrix, and the match probabilities
+    :rtype: dict
+
+    """
+    wrong = np.isin(responses, WRONG)
+    packed = np.concatenate([np.packbits(responses == o, axis=1) for o in WRONG], axis=1)
+
+    "Probability that two wrong answers to a question match"
+    n_wrong = wrong.sum(axis=0)
+    counts = np.array([(responses == o).sum(axis=0) for o in WRONG])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        m = np.where(n_wrong > 0, ((counts/np.maximum(n_wrong, 1))**2).sum(axis=0), 0.0)
+
+    return {'packed': packed, 'wrong': wrong.astype(np.float64), 'm': m}
+
+
+def init_worker(data):
+    _data.update(data)
+
+
+def screen_block(start, stop, top, min_shared=1):
+    """
+    Score the pairs with the first student in rows [start, stop) and the second in a later row.
+
+    :param start: first row of the block
+    :type start: int
+    :param stop: end of the block
+    :type stop: int
+    :param top: number of pairs to keep
+    :type top: int
+    :param min_shared: minimum number of shared wrong answers for a pair to be kept
+    :type min_shared: int
+    :return: the top pairs, as (z, i, j, shared, expected, both wrong)
+    :rtype: list of tuples
+
+    """
+    packed = _data['packed']
+    wrong = _data['wrong']
+    m = _data['m']
+
+    "Shared identical wrong answers"
+    shared = POPCOUNT[packed[start:stop, None, :] & packed[None, start:, :]].sum(axis=2, dtype=np.int64)
+
+    "Chance baseline for the questions both answered wrong"
+    rows = wrong[start:stop]
+    cols = wrong[start:]
+    both = rows @ cols.T
+    expected = (rows*m) @ cols.T
+    var = (rows*(m*(1 - m))) @ cols.T
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = np.where(var > 0, (shared - expected)/np.sqrt(var), 0.0)
+
+    "Only pairs with i < j"
+    ii, jj = np.indices(z.shape)
+    keep = (jj > ii) & (shared >= min_shared)
+    z = np.where(keep, z, -np.inf)
+
+    flat = z.ravel()
+    k = min(top, int(keep.sum()))
+    if k == 0:
+        return []
+    best = np.argpartition(flat, -k)[-k:]
+    bi, bj = np.unravel_index(best, z.shape)
+    return [(float(z[a, b]), start + int(a), start + int(b), int(shared[a, b]), float(expected[a, b]), int(both[a, b]))
+            for a, b in zip(bi, bj)]
+
+
+def screen(responses, top=20, min_shared=1, block_bytes=2**25, pool=None):
+    """
+    Screen all pairs of students.
+
+    :param responses: the responses (students x questions), '1' is correct
+    :type responses: array of strs
+    :param top: number of pairs to report
+    :type top: int
+    :param min_shared: minimum number of shared wrong answers for a pair to be reported
+    :type min_shared: int
+    :param block_bytes: approximate memory for one block of packed comparisons
+    :type block_bytes: int
+    :param pool: process pool to split the blocks across, optional (must be initialized with init_worker)
+    :type pool: concurrent.futures.ProcessPoolExecutor or None
+    :return: the top pairs, as (z, i, j, shared, expected, both wrong), highest z first
+    :rtype: list of tuples
+
+    """
+    n = len(responses)
+    if n < 2:
+        return []
+    if pool is None:
+        init_worker(response_matrices(responses))
+    nbytes = max(1, 4*((responses.shape[1] + 7)//8))
+    size = max(1, block_bytes//(n*nbytes))
+    blocks = [(start, min(start + size, n)) for start in range(0, n, size)]
+
+    if pool is None:
+        results = [screen_block(a, b, top, min_shared) for a, b in blocks]
+    else:
+        results = list(pool.map(screen_block, *zip(*blocks), [top]*len(blocks), [min_shared]*len(blocks)))
+
+    return heapq.nlargest(top, (p for r in results for p in r))
+
+
+if __name__ == "__main__":
+    import argparse
+    import csv
+    from concurrent.futures import ProcessPoolExecutor
+    from examtex.itemstats import read_results
+
+    "Create the parser"
+    parser = argparse.ArgumentParser(description='Screen exam results for answer similarity')
+    parser.add_argument('infile', type=argparse.FileType('r'),
+                        help='Normalized exam result file (csv format)')
+    parser.add_argument('--top', type=int, default=20, help='Number of pairs to report')
+    parser.add_argument('--min_shared', type=int, default=5, help='Minimum number of shared wrong answers')
+    parser.add_argument('--nskip', type=int, default=0, help='Number to skip')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of processes')
+    parser.add_argument('--out', type=argparse.FileType('w'), help='Output file for the pairs (csv format)')
+    args = parser.parse_args()
+
+    q_list, students = read_results(args.infile, args.nskip)
+    responses = np.array([s['responses'] for s in students], dtype=str).reshape(len(students), len(q_list))
+
+    if args.jobs > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs, initializer=init_worker,
+                                 initargs=(response_matrices(responses),)) as pool:
+            pairs = screen(responses, args.top, args.min_shared, pool=pool)
+    else:
+        pairs = screen(responses, args.top, args.min_shared)
+
+    print('{} students, {} questions, {} pairs'.format(len(students), len(q_list), len(students)*(len(students)-1)//2))
+    print('{:>4s} | {:^24s} | {:^24s} | {:>6s} {:>6s} {:>8s} {:>6s}'.format(
+        '#', 'Student', 'Student', 'Wrong', 'Shared', 'Expected', 'z'))
+    print('------------------------------------------------------------------------------------------')
+    for rank, (z, i, j, shared, expected, both) in enumerate(pairs):
+        print('{:4d} | {:24.24s} | {:24.24s} | {:6d} {:6d} {:8.2f} {:6.2f}'.format(
+            rank + 1, students[i]['name'] or '', students[j]['name'] or '', both, shared, expected, z))
+
+    if args.out:
+        writer = csv.writer(args.out)
+        writer.writerow(['CWID 1', 'Student Name 1', 'CWID 2', 'Student Name 2', 'Both Wrong', 'Shared', 'Expected', 'z'])
+        for z, i, j, shared, expected, both in pairs:
+            writer.writerow([students[i]['cwid'], students[i]['name'], students[j]['cwid'], students[j]['name'],
+                             both, shared, '{:.2f}'.format(expected), '{:.2f}'.format(z)])
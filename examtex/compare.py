@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+"""
+Compare item statistics between exam versions, straight from the testing service files.
+
+Each raw result file (one per version, in the order of the exam configuration) is read once. Every
+student is mapped onto the master question list in memory, as normalize.py does, and added to the
+sufficient statistics of their version; no intermediate file is written. The pooled statistics are
+the sum over the versions.
+
+For each question, a chi-square test of homogeneity of the fraction correct across the versions
+(versions x correct/wrong table, k-1 degrees of freedom) shows whether the question behaves
+differently on some version.
+
+"""
+import io
+import csv
+import math
+import hashlib
+from examtex.normalize import question_map, normalize_student
+from examtex.itemstats import new_sums, accumulate, add_sums, item_summary
+
+
+def chi2_sf(x, df):
+    """
+    Survival function (p-value) of the chi-square distribution with integer degrees of freedom.
+
+    >>> print('{:.3f}'.format(chi2_sf(3.841, 1)))
+    0.050
+    >>> print('{:.3f}'.format(chi2_sf(5.991, 2)))
+    0.050
+    >>> print('{:.3f}'.format(chi2_sf(7.815, 3)))
+    0.050
+
+    :param x: the chi-square value
+    :type x: float
+    :param df: the degrees of freedom
+    :type df: int
+    :return: the probability of a value at least x
+    :rtype: float
+
+    """
+    if x <= 0 or df < 1:
+        return 1.0
+    h = x/2
+    if df % 2 == 0:
+        term = total = 1.0
+        for i in range(1, df//2):
+            term *= h/i
+            total += term
+        return math.exp(-h)*total
+
+    total = math.erfc(math.sqrt(h))
+    term = math.sqrt(x)
+    series = 0.0
+    for i in range(1, (df + 1)//2):
+        series += term
+        term *= x/(2*i + 1)
+    return min(1.0, total + math.sqrt(2/math.pi)*math.exp(-h)*series)
+
+
+def homogeneity(sums):
+    """
+    Chi-square test that the fraction correct is the same in every version.
+
+    :param sums: the sums for one question, one per version
+    :type sums: list of dicts
+    :return: the chi-square value, degrees of freedom and p-value
+    :rtype: [float, int, float]
+
+    """
+    rows = [(s['n_a'], s['n'] - s['n_a']) for s in sums if s['n'] > 0]
+    n = sum(c + w for c, w in rows)
+    n_c = sum(c for c, w in rows)
+    df = len(rows) - 1
+    if df < 1 or n_c == 0 or n_c == n:
+        return 0.0, max(df, 0), 1.0
+
+    chi2 = 0.0
+    for c, w in rows:
+        n_v = c + w
+        e_c = n_v*n_c/n
+        e_w = n_v - e_c
+        chi2 += (c - e_c)**2/e_c + (w - e_w)**2/e_w
+    return chi2, df, chi2_sf(chi2, df)
+
+
+def compare(cfg, files):
+    """
+    Read the raw result files and accumulate the item statistics of each version.
+
+    :param cfg: the exam configuration
+    :type cfg: dict
+    :param files: the raw result files, in version order
+    :type files: list of files
+    :return: the master list of questions, and the sums of each version
+    :rtype: [list of strs, list of dicts]
+
+    """
+    questions, n_skipped = question_map(cfg)
+    q_list = sorted(questions.keys())
+
+    version_sums = []
+    for vi, f in enumerate(files):
+        reader = csv.DictReader(f)
+        key = next(reader)
+
+        sums = new_sums(q_list)
+        for student in reader:
+            norm = normalize_student(student, key, questions, q_list, vi, n_skipped)
+            responses = [norm[q] for q in q_list]
+            accumulate(sums, q_list, responses, sum(1 for a in responses if a == '1'))
+        version_sums.append(sums)
+
+    return q_list, version_sums
+
+
+if __name__ == "__main__":
+    import argparse
+    from examtex.config import load_yaml
+    from examtex.itemstats import ItemStats
+
+    "Create the parser"
+    parser = argparse.ArgumentParser(description='Compare items between exam versions')
+    parser.add_argument('config', help='Exam configuration file (YAML format)')
+    parser.add_argument('--files', nargs='+', required=True,
+                        help='Exam result files, must be in order! (csv format)')
+    parser.add_argument('--alpha', type=float, default=0.05, help='Significance level for flagging questions')
+    parser.add_argument('--db', help='Item statistics database file (sqlite) to load the pooled statistics into')
+    args = parser.parse_args()
+
+    cfg = load_yaml(args.config)
+    if len(args.files) != len(cfg['versions']):
+        parser.error('Expected {} result files, one per version'.format(len(cfg['versions'])))
+
+    "Read each file once, keeping the contents for the digest"
+    contents = []
+    for fname in args.files:
+        with open(fname, 'rb') as f:
+            contents.append(f.read())
+    q_list, version_sums = compare(cfg, [io.StringIO(c.decode(), newline='') for c in contents])
+    names = [str(v['version']) for v in cfg['versions']]
+
+    header = '{:>6s} | {:^13s} | '.format('Q', 'All') + ' | '.join('{:^13s}'.format(n) for n in names)
+    print(header + ' | {:>7s} {:>6s}'.format('chi2', 'p'))
+    print('-'*(len(header) + 17))
+    for q in q_list:
+        sums = [vs[q] for vs in version_sums]
+        pooled = sums[0]
+        for s in sums[1:]:
+            pooled = add_sums(pooled, s)
+
+        cols = []
+        for s in [pooled] + sums:
+            summary = item_summary(s)
+            cols.append('{:5.1f}% {:6.3f}'.format(100*summary['d'], summary['r']))
+        chi2, df, p = homogeneity(sums)
+        flag = ' *' if p < args.alpha else ''
+        print('{:>6s} | '.format(q) + ' | '.join(cols) + ' | {:7.2f} {:6.4f}{}'.format(chi2, p, flag))
+
+    print('-'*(len(header) + 17))
+    print('* fraction correct differs between versions (p < {})'.format(args.alpha))
+
+    if args.db:
+        with ItemStats(args.db) as stats:
+            for v, fname, content, sums in zip(cfg['versions'], args.files, contents, version_sums):
+                versions = {q['qid']: q.get('version', 0) for q in v['questions']}
+                try:
+                    loaded = stats.update(sums, cfg['course'], cfg['semester'], cfg['exam'], versions=versions,
+                                          source=fname, digest=hashlib.sha1(content).hexdigest(), kind='raw')
+                except ValueError as err:
+                    print('Skipping {}: {}'.format(fname, err))
+                    break
+                if not loaded:
+                    print('Skipping {}, already loaded'.format(fname))
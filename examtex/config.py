@@ -0,0 +1,194 @@
+"""
+
+Configuration loading and validation.
+
+YAML files are parsed with the C-accelerated safe loader when libyaml is available, and the parsed
+files are cached by path and modification time. The merged configuration is validated in a single
+pass before anything is rendered, and every problem found is reported.
+
+"""
+import os
+import copy
+import yaml
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+REQUIRED = ['question_dir', 'docopts', 'head_foot', 'front',
+            'exam_dir', 'course', 'semester', 'exam', 'versions', 'num_per_page']
+
+"Parsed files, keyed by path, with the modification time and size when parsed"
+_cache = {}
+
+
+def load_yaml(path):
+    """
+    Load a YAML file, using the cached result if the file has not changed.
+
+    :param path: path to the file
+    :type path: str
+    :return: the parsed file (a copy, so it can be modified)
+    :rtype: dict
+    :raises ValueError: if the file does not contain a mapping
+
+    """
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+
+    cached = _cache.get(path)
+    if cached is None or cached[0] != stamp:
+        with open(path, 'r') as f:
+            data = yaml.load(f, Loader=SafeLoader)
+        if data is None:
+            data = {}
+        if not isinstance(data, dict):
+            raise ValueError('{} must contain a mapping, got {}'.format(path, type(data).__name__))
+        cached = (stamp, data)
+        _cache[path] = cached
+
+    return copy.deepcopy(cached[1])
+
+
+def load_config(exam, config, overrides=None):
+    """
+    Load and merge the configuration, with precedence: overrides > exam yaml > config yaml.
+
+    :param exam: path to the exam configuration file
+    :type exam: str
+    :param config: path to the general configuration file
+    :type config: str
+    :param overrides: any other configuration (from the command line), optional
+    :type overrides: dict or None
+    :return: the merged configuration
+    :rtype: dict
+
+    """
+    return {**load_yaml(config), **load_yaml(exam), **(overrides or {})}
+
+
+def _check_question(where, q, errors):
+    """
+    Check one question entry of a version, adding any problems to errors.
+
+    """
+    if not isinstance(q, dict) or 'qid' not in q:
+        errors.append('{}: question must be a mapping with a qid: {!r}'.format(where, q))
+        return
+    qid = q['qid']
+    where = '{}, question {!r}'.format(where, qid)
+    if not isinstance(qid, str):
+        errors.append('{}: qid must be a string (quote it in the yaml file)'.format(where))
+
+    if 'version' not in q:
+        errors.append('{}: missing version'.format(where))
+    else:
+        qv = q['version']
+        if not isinstance(qv, int) or isinstance(qv, bool) or qv < 0:
+            errors.append('{}: version must be a non-negative integer, got {!r}'.format(where, qv))
+
+    pts = q.get('pts')
+    if pts is not None and (not isinstance(pts, (int, float)) or isinstance(pts, bool) or pts < 0):
+        errors.append('{}: pts must be a non-negative number, got {!r}'.format(where, pts))
+
+    if 'perm' in q:
+        perm = q['perm']
+        if (not isinstance(perm, list) or not all(isinstance(p, int) and not isinstance(p, bool) for p in perm)
+                or sorted(perm) != list(range(len(perm)))):
+            errors.append('{}: perm must be a permutation of 0-(n_choice-1), got {!r}'.format(where, perm))
+
+
+def validate_config(cfg):
+    """
+    Validate the whole configuration: required keys, the versions, the question entries and
+    permutations, and that every question file exists.
+
+    :param cfg: the configuration
+    :type cfg: dict
+    :return: the problems found, empty if the configuration is valid
+    :rtype: list of strs
+
+    """
+    if not isinstance(cfg, dict):
+        return ['Configuration must be a mapping, got {}'.format(type(cfg).__name__)]
+
+    errors = []
+
+    missing = [k for k in REQUIRED if k not in cfg]
+    if missing:
+        errors.append('Configuration is missing the following keys: {}'.format(missing))
+
+    if 'docopts' in cfg and not isinstance(cfg['docopts'], list):
+        errors.append('docopts must be a list, got {!r}'.format(cfg['docopts']))
+
+    npp = cfg.get('num_per_page')
+    if npp is not None and (not isinstance(npp, int) or npp < 1):
+        errors.append('num_per_page must be a positive integer, got {!r}'.format(npp))
+
+    if 'semester' in cfg and len(str(cfg['semester']).split()) != 2:
+        errors.append("semester must look like 'Fall 2022', got {!r}".format(cfg['semester']))
+
+    versions = cfg.get('versions')
+    if 'versions' in cfg and (not isinstance(versions, list) or not versions):
+        errors.append('versions must be a non-empty list')
+        versions = []
+
+    names = set()
+    qids = set()
+    for vi, v in enumerate(versions or []):
+        if not isinstance(v, dict):
+            errors.append('version {}: must be a mapping'.format(vi))
+            continue
+
+        name = v.get('version')
+        where = 'version {!r}'.format(name if name is not None else vi)
+        if name is None:
+            errors.append('{}: missing version name'.format(where))
+        elif not isinstance(name, str):
+            errors.append('{}: version name must be a string'.format(where))
+        elif name in names:
+            errors.append('{}: duplicate version name'.format(where))
+        else:
+            names.add(name)
+
+        questions = v.get('questions')
+        if not isinstance(questions, list):
+            errors.append('{}: questions must be a list'.format(where))
+            questions = []
+        order = v.get('order')
+        if not isinstance(order, list):
+            errors.append('{}: order must be a list'.format(where))
+            order = []
+
+        vqids = set()
+        for q in questions:
+            _check_question(where, q, errors)
+            if isinstance(q, dict) and isinstance(q.get('qid'), str):
+                if q['qid'] in vqids:
+                    errors.append('{}: question {!r} appears more than once'.format(where, q['qid']))
+                vqids.add(q['qid'])
+
+        for qn in order:
+            if not isinstance(qn, str):
+                errors.append('{}: order entry {!r} must be a string'.format(where, qn))
+            elif qn != 'np' and qn not in vqids:
+                errors.append('{}: order entry {!r} is not in questions'.format(where, qn))
+        qids.update(vqids)
+
+    template_dir = cfg.get('template_dir')
+    if template_dir is not None and not os.path.isdir(template_dir):
+        errors.append('template_dir {} does not exist'.format(template_dir))
+
+    question_dir = cfg.get('question_dir')
+    if question_dir is not None:
+        if not os.path.isdir(question_dir):
+            errors.append('question_dir {} does not exist'.format(question_dir))
+        else:
+            for qid in sorted(qids):
+                qfile = os.path.join(question_dir, 'q{}.py'.format(qid))
+                if not os.path.isfile(qfile):
+                    errors.append('question file {} does not exist'.format(qfile))
+
+    return errors
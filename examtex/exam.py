@@ -31,6 +31,7 @@ Optional parameters:
         pkgconfig: specified in configuration, defaults to none
         start_on_new: specified in configuration or command line, defaults to false
         back: specified in configuration, defaults to none
+        template_dir: specified in configuration, defaults to the templates directory
     - question.tex:
         meta: specified in configuration, defaults to none
         pts: specified in configuration, defaults to none
@@ -52,6 +53,7 @@ Exam specific configuration:
 """
 import copy
 from examtex.util import QuestionFactory, JinjaEnv, check_config
+from examtex.config import load_config
 
 
 class Exam(object):
@@ -117,42 +119,46 @@ class Exam(object):
 
         """
 
-        # create the docopts_str
-        docopts = copy.deepcopy(self.docopts)
-        if answers:
-            docopts.append('answers')
-        self.docopts_str = ', '.join(docopts)
-
-        # render the head_foot
-        head_foot = JinjaEnv().env.from_string(self.head_foot).render(self.__dict__)
-
-        # render the front page
-        self.this_version = version['version']
-        front = JinjaEnv().env.from_string(self.front).render(self.__dict__)
-
-        # render the questions
-        qf = QuestionFactory(question_dir=self.question_dir)
-        qs = []
-        for qn in version['order']:
-            if qn == 'np':
-                qs.append(r'\ifprintanswers\else\newpage\fi')
-            else:
-                for q in version['questions']:
-                    if q['qid'] == qn:
-                        pts = q['pts'] if 'pts' in q else None
-                        perm = q['perm'] if 'perm' in q else None
-                        qs.append(qf.make_question(qn, version=q['version'], pts=pts, perm=perm))
-
-        # copy the current dict and replace any rendered fields
-        tvars = copy.deepcopy(self.__dict__)
-        tvars['questions'] = qs
-        tvars['head_foot'] = head_foot
-        tvars['front'] = front
-
-        # now render the exam
-        efile = JinjaEnv().env.get_template('exam.tex').render(tvars)
-
-        return efile
+        # render with the configured templates, or those already in use, also used by the question files
+        template_dir = getattr(self, 'template_dir', None) or JinjaEnv._current.get()
+        with JinjaEnv.using(template_dir) as env:
+
+            # create the docopts_str
+            docopts = copy.deepcopy(self.docopts)
+            if answers:
+                docopts.append('answers')
+            self.docopts_str = ', '.join(docopts)
+
+            # render the head_foot
+            head_foot = env.from_string(self.head_foot).render(self.__dict__)
+
+            # render the front page
+            self.this_version = version['version']
+            front = env.from_string(self.front).render(self.__dict__)
+
+            # render the questions
+            qf = QuestionFactory(question_dir=self.question_dir)
+            qs = []
+            for qn in version['order']:
+                if qn == 'np':
+                    qs.append(r'\ifprintanswers\else\newpage\fi')
+                else:
+                    for q in version['questions']:
+                        if q['qid'] == qn:
+                            pts = q['pts'] if 'pts' in q else None
+                            perm = q['perm'] if 'perm' in q else None
+                            qs.append(qf.make_question(qn, version=q['version'], pts=pts, perm=perm))
+
+            # copy the current dict and replace any rendered fields
+            tvars = copy.deepcopy(self.__dict__)
+            tvars['questions'] = qs
+            tvars['head_foot'] = head_foot
+            tvars['front'] = front
+
+            # now render the exam
+            efile = env.get_template('exam.tex').render(tvars)
+
+            return efile
 
     def __repr__(self):
         return str(self.__dict__)
@@ -166,8 +172,7 @@ if __name__ == "__main__":
 
     "Create the parser"
     parser = argparse.ArgumentParser(description="Examtex maker thingy")
-    parser.add_argument('exam', type=argparse.FileType('r'),
-                        help='Exam file (YAML format)')
+    parser.add_argument('exam', help='Exam file (YAML format)')
     parser.add_argument('--config', help='Exam configuration file (YAML format)')
     parser.add_argument('--num_per_page', type=int, help='Number of questions per page')
     parser.add_argument('--start_on_new', choices=['true', 'false'],
@@ -182,21 +187,6 @@ if __name__ == "__main__":
         cdir = os.path.dirname(os.path.abspath(inspect.stack()[0][1]))
         cfg_file = "{}/../config.yml".format(cdir)
 
-    "load the config file"
-    try:
-        with open(cfg_file, 'r') as f:
-            default_cfg = yaml.load(f, Loader=yaml.Loader)
-    except FileNotFoundError as err:
-        print('Error setting up config: ', err)
-        raise SystemExit
-
-    "next load the exam file"
-    try:
-        exam_cfg = yaml.load(args.exam, Loader=yaml.Loader)
-    except FileNotFoundError as err:
-        print('Error loading exam yaml file: ', err)
-        raise SystemExit
-
     "finally check for any overrides on the command line"
     arg_cfg = {}
     if args.num_per_page:
@@ -204,8 +194,12 @@ if __name__ == "__main__":
     if args.start_on_new:
         arg_cfg['start_on_new'] = args.start_on_new
 
-    "merge the configs (in order)"
-    cfg = {**default_cfg, **exam_cfg, **arg_cfg}
+    "load and merge the configs (in order)"
+    try:
+        cfg = load_config(args.exam, cfg_file, arg_cfg)
+    except (OSError, ValueError, yaml.YAMLError) as err:
+        print('Error setting up config: ', err)
+        raise SystemExit
 
     "check that the configuration is valid"
     if not check_config(cfg):
@@ -0,0 +1,510 @@
+#!/usr/bin/env python
+"""
+Historical item statistics database.
+
+Item statistics are stored in a local SQLite database, keyed by question id and question version,
+with one row per exam sitting (course, semester, exam). Each row holds the sufficient statistics
+for that item:
+    - n:      number of students responding to the item
+    - n_a-e:  number of students choosing each option (n_a is the correct answer after normalizing)
+    - sum_s:  sum of the total scores of the responding students
+    - sum_s2: sum of the squared total scores
+    - sum_xs: sum of the total scores of the students answering correctly
+
+These sums are additive, so results from several sections of the same exam can be loaded one at a
+time and are accumulated into the same row. The difficulty `d` and the point-biserial correlation
+`r` are derived from the sums of each row when queried; when rows are combined, d and r are
+combined rather than the sums, since the total scores of different sittings are not comparable.
+
+Each loaded file is recorded by its digest so it can not be counted twice. A sitting is loaded
+either from normalized results (itemstats.py load) or from the raw version files (compare.py --db),
+never both: the two kinds of file have different digests, so loading both would count every
+student twice. The kind is recorded for each sitting and the other kind is refused. Either way
+the rows hold the statistics pooled over the exam versions, since they are keyed by question
+version, not exam version.
+
+"""
+import csv
+import math
+import sqlite3
+import hashlib
+
+OPTIONS = ['1', '2', '3', '4', '5']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS item_stats (
+    qid      TEXT    NOT NULL,
+    version  INTEGER NOT NULL,
+    course   TEXT    NOT NULL,
+    semester TEXT    NOT NULL,
+    exam     TEXT    NOT NULL,
+    n        INTEGER NOT NULL DEFAULT 0,
+    n_a      INTEGER NOT NULL DEFAULT 0,
+    n_b      INTEGER NOT NULL DEFAULT 0,
+    n_c      INTEGER NOT NULL DEFAULT 0,
+    n_d      INTEGER NOT NULL DEFAULT 0,
+    n_e      INTEGER NOT NULL DEFAULT 0,
+    sum_s    REAL    NOT NULL DEFAULT 0,
+    sum_s2   REAL    NOT NULL DEFAULT 0,
+    sum_xs   REAL    NOT NULL DEFAULT 0,
+    PRIMARY KEY (qid, version, course, semester, exam)
+);
+CREATE INDEX IF NOT EXISTS item_stats_sitting ON item_stats (course, semester, exam);
+CREATE TABLE IF NOT EXISTS sources (
+    digest   TEXT PRIMARY KEY,
+    name     TEXT NOT NULL,
+    course   TEXT NOT NULL,
+    semester TEXT NOT NULL,
+    exam     TEXT NOT NULL,
+    loaded   TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS sittings (
+    course   TEXT NOT NULL,
+    semester TEXT NOT NULL,
+    exam     TEXT NOT NULL,
+    kind     TEXT NOT NULL,
+    PRIMARY KEY (course, semester, exam)
+);
+"""
+
+SUMS = ['n', 'n_a', 'n_b', 'n_c', 'n_d', 'n_e', 'sum_s', 'sum_s2', 'sum_xs']
+
+
+def read_results(f, nskip=0):
+    """
+    Read a normalized exam result file. The same conventions as analyze.py are used: the questions
+    are the columns after the first five, the first `nskip` of them must be answered '1' (otherwise
+    the student is skipped) and are not counted, and a response of '1' is correct.
+
+    :param f: the result file (csv format)
+    :type f: file
+    :param nskip: number of leading questions to skip
+    :type nskip: int
+    :return: the list of questions and the list of students
+    :rtype: [list of strs, list of dicts]
+
+    """
+    reader = csv.DictReader(f)
+    q_list = reader.fieldnames[5 + nskip:]
+    skip = reader.fieldnames[5:5 + nskip]
+
+    students = []
+    for row in reader:
+
+        "Check the skipped questions"
+        if any(row[qn] != '1' for qn in skip):
+            print('WARNING: Wrong response for version number, skipping student')
+            continue
+
+        responses = [row[qn] for qn in q_list]
+        score = sum(1 for a in responses if a == '1')
+        students.append({'name': row.get('Student Name'),
+                         'cwid': row.get('CWID'),
+                         'score': score,
+                         'responses': responses})
+
+    return q_list, students
+
+
+def new_sums(q_list):
+    """
+    Create empty sufficient statistics for each question.
+
+    :param q_list: the list of questions
+    :type q_list: list of strs
+    :return: the sums for each question, keyed by question
+    :rtype: dict
+
+    """
+    return {qn: dict.fromkeys(SUMS, 0) for qn in q_list}
+
+
+def accumulate(sums, q_list, responses, score):
+    """
+    Add one student's responses to the sufficient statistics.
+
+    :param sums: the sums for each question, keyed by question
+    :type sums: dict
+    :param q_list: the list of questions
+    :type q_list: list of strs
+    :param responses: the student's responses, in the order of q_list
+    :type responses: list of strs
+    :param score: the student's total score
+    :type score: int
+
+    """
+    for qn, a in zip(q_list, responses):
+        if a not in OPTIONS:
+            continue
+        qs = sums[qn]
+        qs['n'] += 1
+        qs[SUMS[OPTIONS.index(a) + 1]] += 1
+        qs['sum_s'] += score
+        qs['sum_s2'] += score**2
+        if a == '1':
+            qs['sum_xs'] += score
+
+
+def item_sums(q_list, students):
+    """
+    Accumulate the sufficient statistics for each question.
+
+    :param q_list: the list of questions
+    :type q_list: list of strs
+    :param students: the students, as returned by read_results
+    :type students: list of dicts
+    :return: the sums for each question, keyed by question
+    :rtype: dict
+
+    """
+    sums = new_sums(q_list)
+    for student in students:
+        accumulate(sums, q_list, student['responses'], student['score'])
+    return sums
+
+
+def kr20(n_q, pq, var):
+    """
+    Calculate the KR-20 reliability.
+
+    :param n_q: number of questions
+    :type n_q: int
+    :param pq: sum of d(1-d) over the questions
+    :type pq: float
+    :param var: variance of the total scores
+    :type var: float
+    :return: the KR-20, 0 if it is not defined (fewer than 2 questions, or no variance)
+    :rtype: float
+
+    """
+    if n_q < 2 or var <= 0:
+        return 0.0
+    return (n_q/(n_q - 1))*(1 - pq/var)
+
+
+def add_sums(a, b):
+    """
+    Combine two sets of sufficient statistics.
+
+    :param a: the first sums
+    :type a: dict
+    :param b: the second sums
+    :type b: dict
+    :return: the combined sums
+    :rtype: dict
+
+    """
+    return {k: a.get(k, 0) + b.get(k, 0) for k in SUMS}
+
+
+def item_summary(sums):
+    """
+    Calculate the difficulty and the point-biserial correlation from the sufficient statistics.
+
+    :param sums: the sums for one question
+    :type sums: dict
+    :return: n, the difficulty d (fraction correct) and the point-biserial correlation r
+    :rtype: dict
+
+    """
+    n = sums['n']
+    n_c = sums['n_a']
+    d = n_c/n if n else 0.0
+
+    r = 0.0
+    var_x = n*n_c - n_c**2
+    var_s = n*sums['sum_s2'] - sums['sum_s']**2
+    if var_x > 0 and var_s > 0:
+        r = (n*sums['sum_xs'] - n_c*sums['sum_s'])/math.sqrt(var_x*var_s)
+
+    return {'n': n, 'd': d, 'r': r}
+
+
+class ItemStats(object):
+    """
+    The item statistics database.
+
+    :param path: path to the database file, created if it does not exist
+    :type path: str
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def has_source(self, digest):
+        """
+        Check whether a file has already been loaded.
+
+        :param digest: the digest of the file contents
+        :type digest: str
+        :rtype: bool
+
+        """
+        cur = self.db.execute('SELECT 1 FROM sources WHERE digest = ?', (digest,))
+        return cur.fetchone() is not None
+
+    def update(self, sums, course, semester, exam, versions=None, source=None, digest=None, kind='normalized'):
+        """
+        Add the sufficient statistics for one set of results to the database. All of the updates
+        are done in a single transaction.
+
+        :param sums: the sums, keyed by question, as returned by item_sums
+        :type sums: dict
+        :param course: the course
+        :type course: str
+        :param semester: the semester
+        :type semester: str
+        :param exam: the exam
+        :type exam: str
+        :param versions: the question version for each question, -1 (pooled) if not given
+        :type versions: dict or None
+        :param source: the name of the loaded file, optional
+        :type source: str or None
+        :param digest: the digest of the loaded file, optional
+        :type digest: str or None
+        :param kind: the kind of results, 'normalized' or 'raw'
+        :type kind: str
+        :return: False if the file was already loaded, True otherwise
+        :rtype: bool
+        :raises ValueError: if the sitting was already loaded from the other kind of results
+
+        """
+        versions = versions or {}
+        cols = ', '.join(SUMS)
+        marks = ', '.join('?' for _ in SUMS)
+        adds = ', '.join('{0} = {0} + excluded.{0}'.format(k) for k in SUMS)
+        sql = ('INSERT INTO item_stats (qid, version, course, semester, exam, {}) '
+               'VALUES (?, ?, ?, ?, ?, {}) '
+               'ON CONFLICT (qid, version, course, semester, exam) DO UPDATE SET {}').format(cols, marks, adds)
+
+        with self.db:
+            if digest:
+                if self.has_source(digest):
+                    return False
+
+            cur = self.db.execute('SELECT kind FROM sittings WHERE course = ? AND semester = ? AND exam = ?',
+                                  (course, semester, exam))
+            row = cur.fetchone()
+            if row is None:
+                self.db.execute('INSERT INTO sittings (course, semester, exam, kind) VALUES (?, ?, ?, ?)',
+                                (course, semester, exam, kind))
+            elif row['kind'] != kind:
+                raise ValueError('{} {} {} is already loaded from {} results, can not add {} results'.format(
+                    course, semester, exam, row['kind'], kind))
+
+            if digest:
+                self.db.execute('INSERT INTO sources (digest, name, course, semester, exam) VALUES (?, ?, ?, ?, ?)',
+                                (digest, source or '', course, semester, exam))
+
+            rows = []
+            for qn, qs in sums.items():
+                v = versions.get(qn)
+                rows.append([qn, -1 if v is None else v, course, semester, exam] + [qs[k] for k in SUMS])
+            self.db.executemany(sql, rows)
+
+        return True
+
+    def history(self, qid, version=None):
+        """
+        Get the performance history of a question, one entry per exam sitting, in chronological order.
+
+        :param qid: id of question
+        :type qid: str
+        :param version: the question version, optional (all versions if not given)
+        :type version: int or None
+        :return: the history, with the difficulty and point-biserial correlation
+        :rtype: list of dicts
+
+        """
+        sql = 'SELECT * FROM item_stats WHERE qid = ?'
+        params = [qid]
+        if version is not None:
+            sql += ' AND version = ?'
+            params.append(version)
+
+        history = []
+        for row in self.db.execute(sql, params):
+            entry = dict(row)
+            entry.update(item_summary(entry))
+            history.append(entry)
+        history.sort(key=lambda h: (term_key(h['semester']), h['exam'], h['course'], h['version']))
+        return history
+
+    def summary(self, qids=None):
+        """
+        Get the statistics for each question, combined over all sittings and versions. The total
+        scores of different sittings are not comparable, so d and r are calculated for each row and
+        then combined: d weighted by n, and r by averaging Fisher's z weighted by n-3.
+
+        :param qids: the questions to include, optional (all questions if not given)
+        :type qids: list of strs or None
+        :return: the combined statistics (n, the option counts, d, r and version), keyed by question
+        :rtype: dict
+
+        """
+        sql = 'SELECT * FROM item_stats'
+        params = []
+        if qids is not None:
+            qids = list(qids)
+            sql += ' WHERE qid IN ({})'.format(', '.join('?' for _ in qids))
+            params = qids
+
+        rows = {}
+        for row in self.db.execute(sql, params):
+            rows.setdefault(row['qid'], []).append(dict(row))
+
+        return {qid: combine(entries) for qid, entries in rows.items()}
+
+
+def combine(entries):
+    """
+    Combine the statistics of one question from several rows (sittings or versions). The counts are
+    added, d is weighted by n, and r is the average of Fisher's z = atanh(r) weighted by n-3. The
+    version is the question version (not pooled) with the most responses, None if there is none.
+
+    :param entries: the rows, each with the sums
+    :type entries: list of dicts
+    :return: the combined counts, d, r and version
+    :rtype: dict
+
+    """
+    combined = dict.fromkeys(SUMS[:6], 0)
+    version_n = {}
+    sum_d = 0.0
+    sum_z = 0.0
+    w_z = 0
+    for entry in entries:
+        summary = item_summary(entry)
+        for k in SUMS[:6]:
+            combined[k] += entry[k]
+        sum_d += summary['n']*summary['d']
+        if entry.get('version', -1) >= 0:
+            version_n[entry['version']] = version_n.get(entry['version'], 0) + summary['n']
+        if summary['n'] > 3:
+            r = max(min(summary['r'], 0.999999), -0.999999)
+            sum_z += (summary['n'] - 3)*math.atanh(r)
+            w_z += summary['n'] - 3
+
+    n = combined['n']
+    combined['d'] = sum_d/n if n else 0.0
+    combined['r'] = math.tanh(sum_z/w_z) if w_z else 0.0
+    combined['version'] = max(version_n, key=version_n.get) if version_n else None
+    return combined
+
+
+TERMS = ['Spring', 'Summer', 'Fall']
+
+
+def term_key(semester):
+    """
+    Sort key for a semester like 'Fall 2022': the year, then the term within the year.
+
+    :param semester: the semester
+    :type semester: str
+    :return: the sort key
+    :rtype: tuple
+
+    """
+    parts = str(semester).split()
+    year = int(parts[-1]) if parts and parts[-1].isdigit() else 0
+    term = TERMS.index(parts[0]) if parts and parts[0] in TERMS else len(TERMS)
+    return year, term, str(semester)
+
+
+def question_versions(cfg):
+    """
+    Get the question version used for each question in an exam configuration. Questions that appear
+    with different versions across the exam versions are pooled (-1).
+
+    :param cfg: the exam configuration
+    :type cfg: dict
+    :return: the question version, keyed by question
+    :rtype: dict
+
+    """
+    versions = {}
+    for v in cfg['versions']:
+        for q in v['questions']:
+            qv = q.get('version', 0)
+            if versions.get(q['qid'], qv) != qv:
+                qv = -1
+            versions[q['qid']] = qv
+    return versions
+
+
+if __name__ == "__main__":
+    import argparse
+    from examtex.config import load_yaml
+
+    "Create the parser"
+    parser = argparse.ArgumentParser(description='Item statistics database')
+    parser.add_argument('db', help='Item statistics database file (sqlite)')
+    sub = parser.add_subparsers(dest='cmd', required=True)
+
+    p_load = sub.add_parser('load', help='Load normalized exam results')
+    p_load.add_argument('files', nargs='+', help='Normalized exam result files (csv format)')
+    p_load.add_argument('--config',
+                        help='Exam configuration file (YAML format), supplies course/semester/exam and versions')
+    p_load.add_argument('--course', help='The course')
+    p_load.add_argument('--semester', help='The semester')
+    p_load.add_argument('--exam', help='The exam')
+    p_load.add_argument('--nskip', type=int, default=0, help='Number to skip')
+
+    p_hist = sub.add_parser('history', help='Show the history of questions')
+    p_hist.add_argument('qids', nargs='+', help='Question ids')
+    p_hist.add_argument('--version', type=int, help='Question version')
+    args = parser.parse_args()
+
+    with ItemStats(args.db) as stats:
+
+        if args.cmd == 'load':
+
+            "Get the exam details from the config, then the command line"
+            try:
+                exam_cfg = load_yaml(args.config) if args.config else {}
+            except (OSError, ValueError) as err:
+                parser.error(str(err))
+            versions = question_versions(exam_cfg) if 'versions' in exam_cfg else {}
+            course = args.course or exam_cfg.get('course')
+            semester = args.semester or exam_cfg.get('semester')
+            exam = args.exam or exam_cfg.get('exam')
+            if not (course and semester and exam):
+                parser.error('course, semester and exam must be given, either directly or with --config')
+
+            for fname in args.files:
+                with open(fname, 'rb') as f:
+                    digest = hashlib.sha1(f.read()).hexdigest()
+                with open(fname, 'r', newline='') as f:
+                    q_list, students = read_results(f, args.nskip)
+                try:
+                    loaded = stats.update(item_sums(q_list, students), course, semester, exam,
+                                          versions=versions, source=fname, digest=digest)
+                except ValueError as err:
+                    print('Skipping {}: {}'.format(fname, err))
+                    continue
+                if loaded:
+                    print('Loaded {} students, {} questions from {}'.format(len(students), len(q_list), fname))
+                else:
+                    print('Skipping {}, already loaded'.format(fname))
+
+        elif args.cmd == 'history':
+            print('{:>6s} {:>3s} {:<8s} {:<12s} {:<10s} {:>5s} {:>6s} {:>6s}'.format(
+                'Q', 'V', 'Course', 'Semester', 'Exam', 'N', 'd', 'r'))
+            print('----------------------------------------------------------------')
+            for qid in args.qids:
+                for h in stats.history(qid, args.version):
+                    print('{:>6s} {:3d} {:<8s} {:<12s} {:<10s} {:5d} {:6.3f} {:6.3f}'.format(
+                        h['qid'], h['version'], h['course'], h['semester'], h['exam'], h['n'], h['d'], h['r']))
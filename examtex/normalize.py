@@ -10,104 +10,142 @@ import argparse
 import yaml
 import csv
 
-"Create and configure the command-line argument parser"
-parser = argparse.ArgumentParser(description='Exam Result Normalizer')
-parser.add_argument('config', type=argparse.FileType('r'),
-                    help='Exam configuration file (YAML format)')
-parser.add_argument('--files', nargs='+', type=argparse.FileType('r'), default=[],
-                    help='Exam result files, must be in order! (csv format)')
-parser.add_argument('--out', type=argparse.FileType('w'),
-                    help='Exam normalized result file name')
-args = parser.parse_args()
-
-
-"Load the exam configuration"
-try:
-    cfg = yaml.safe_load(args.config)
-except:
-    parser.error('Config file does not appear to be valid YAML.')
-
-
-"Fill the data needed to construct the mapping"
-questions = {}
-for vi, v in enumerate(cfg['versions']):
-    q_key = "q{}".format(vi)
-    p_key = "p{}".format(vi)
-
-    for i, q in enumerate(v['order']):
-        n_skipped = 0
-        if q != 'np':
-            for qd in v['questions']:
-                if 'perm' in qd:
-                    if q == qd['qid']:
-                        if q not in questions:
-                            questions[q] = {}
-                        questions[q][q_key] = i
-                        questions[q][p_key] = qd['perm']
-                else:
-                    n_skipped += 1
-
-"This is the master list of questions"
-q_list = sorted(questions.keys())
-#print(questions)
-
-"Now process each of the input files"
-csv_header = None
-norm_students = []
-for i, f in enumerate(args.files):
-    reader = csv.DictReader(f)
-
-    "Create the csv header for the outfile"
-    csv_header = reader.fieldnames[:5]
-    for q in q_list:
-        csv_header.append(q)
 
+def question_map(cfg):
+    """
+    Construct the mapping from the exam configuration: for each multiple-choice question, its
+    position (q<version index>) and choice permutation (p<version index>) in each version.
+
+    :param cfg: the exam configuration
+    :type cfg: dict
+    :return: the mapping, keyed by question, and the number of skipped questions
+    :rtype: [dict, int]
+
+    """
+    questions = {}
+    n_skipped = 0
+    for vi, v in enumerate(cfg['versions']):
+        q_key = "q{}".format(vi)
+        p_key = "p{}".format(vi)
+
+        for i, q in enumerate(v['order']):
+            n_skipped = 0
+            if q != 'np':
+                for qd in v['questions']:
+                    if 'perm' in qd:
+                        if q == qd['qid']:
+                            if q not in questions:
+                                questions[q] = {}
+                            questions[q][q_key] = i
+                            questions[q][p_key] = qd['perm']
+                    else:
+                        n_skipped += 1
+
+    return questions, n_skipped
+
+
+def normalize_student(student, key, questions, q_list, vi, n_skipped=0):
+    """
+    Map one student's responses for version vi onto the master question list.
+
+    :param student: the student row from the testing service file
+    :type student: dict
+    :param key: the exam key row from the testing service file
+    :type key: dict
+    :param questions: the mapping, as returned by question_map
+    :type questions: dict
+    :param q_list: the master list of questions
+    :type q_list: list of strs
+    :param vi: the version index
+    :type vi: int
+    :param n_skipped: the number of skipped questions
+    :type n_skipped: int
+    :return: the normalized student
+    :rtype: dict
+
+    """
     "These are the keys for question/permutation"
-    qs = 'q' + str(i)
-    ps = 'p' + str(i)
-
-    "Get the exam key"
-    key = next(reader)
-    
-    "Iterate over the student responses"
-    for student in reader:
-
-        "Create the normalized output for this student"
-        norm = {}
-        norm['CWID'] = student['CWID']
-        norm['Mybama ID'] = student['Mybama ID']
-        norm['Student Name'] = student['Student Name']
-        norm['Raw Score'] = int(student['Raw Score']) - n_skipped
-
-        "Iterate over the master question list"
+    qs = 'q' + str(vi)
+    ps = 'p' + str(vi)
+
+    "Create the normalized output for this student"
+    norm = {}
+    norm['CWID'] = student['CWID']
+    norm['Mybama ID'] = student['Mybama ID']
+    norm['Student Name'] = student['Student Name']
+    norm['Raw Score'] = int(student['Raw Score']) - n_skipped
+
+    "Iterate over the master question list"
+    for q in q_list:
+
+        "Get the question number and answer permutation for this version"
+        ver_q = questions[q][qs]
+        ver_p = questions[q][ps]
+
+        "Get the student response and check for correct answers"
+        response = student[str(ver_q+1)]
+        if response == '.':
+            response = key[str(ver_q+1)]
+
+        "Now map the response using this versions permutation"
+        try:
+            r = int(response)  # This will fail for '*', '-', and ' '
+            mapped_response = str(ver_p[r-1]+1)
+        except:
+            mapped_response = response
+
+        "Add the mapped question/response to the normalized student response"
+        norm[q] = mapped_response
+
+    return norm
+
+
+if __name__ == "__main__":
+
+    "Create and configure the command-line argument parser"
+    parser = argparse.ArgumentParser(description='Exam Result Normalizer')
+    parser.add_argument('config', type=argparse.FileType('r'),
+                        help='Exam configuration file (YAML format)')
+    parser.add_argument('--files', nargs='+', type=argparse.FileType('r'), default=[],
+                        help='Exam result files, must be in order! (csv format)')
+    parser.add_argument('--out', type=argparse.FileType('w'),
+                        help='Exam normalized result file name')
+    args = parser.parse_args()
+
+    "Load the exam configuration"
+    try:
+        cfg = yaml.safe_load(args.config)
+    except:
+        parser.error('Config file does not appear to be valid YAML.')
+
+    "Fill the data needed to construct the mapping"
+    questions, n_skipped = question_map(cfg)
+
+    "This is the master list of questions"
+    q_list = sorted(questions.keys())
+
+    "Now process each of the input files"
+    csv_header = None
+    norm_students = []
+    for i, f in enumerate(args.files):
+        reader = csv.DictReader(f)
+
+        "Create the csv header for the outfile"
+        csv_header = reader.fieldnames[:5]
         for q in q_list:
-        
-            "Get the question number and answer permutation for this version"
-            ver_q = questions[q][qs]
-            ver_p = questions[q][ps]
-            
-            "Get the student response and check for correct answers"
-            response = student[str(ver_q+1)]
-            if response == '.':
-                response = key[str(ver_q+1)]
-
-            "Now map the response using this versions permutation"
-            try:
-                r = int(response)  # This will fail for '*', '-', and ' '
-                mapped_response = str(ver_p[r-1]+1)
-            except:
-                mapped_response = response
-            
-            "Add the mapped question/response to the normalized student response"
-            norm[q] = mapped_response
-
-        "Append this student"
-        norm_students.append(norm)
-
-"Finally, write it out"
-if args.out:
-    writer = csv.DictWriter(args.out, csv_header)     
-    writer.writeheader()
-    
-    for ns in norm_students:
-        writer.writerow(ns)
+            csv_header.append(q)
+
+        "Get the exam key"
+        key = next(reader)
+
+        "Iterate over the student responses"
+        for student in reader:
+            norm_students.append(normalize_student(student, key, questions, q_list, i, n_skipped))
+
+    "Finally, write it out"
+    if args.out:
+        writer = csv.DictWriter(args.out, csv_header)
+        writer.writeheader()
+
+        for ns in norm_students:
+            writer.writerow(ns)
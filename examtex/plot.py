@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+"""
+Plot normalized exam results to files, without a display.
+
+For each result file two figures are written:
+    - <name>_scores: histogram and boxplot of the scores
+    - <name>_items:  for each question, the fraction of students choosing each option vs score group
+
+The figures are created directly, not through pyplot, so no backend or display is needed, and each
+process draws every plot on a single figure object that is cleared between plots. The files are split
+across a process pool. analyze.py --plot uses the same drawing functions on a pyplot figure.
+
+"""
+import os
+import math
+import numpy as np
+import matplotlib
+import seaborn as sns
+from matplotlib.figure import Figure
+from examtex.itemstats import OPTIONS, read_results, kr20
+
+LABELS = ['A', 'B', 'C', 'D', 'E']
+
+"The plot style, for the files and the display"
+sns.set(style="ticks")
+
+"The figure for this process, created on first use"
+_figure = None
+
+
+def get_figure():
+    """
+    Get the figure for this process, cleared and ready for drawing.
+
+    :return: the figure
+    :rtype: matplotlib.figure.Figure
+
+    """
+    global _figure
+    if _figure is None:
+        _figure = Figure()
+    _figure.clf()
+    _figure.subplots_adjust(**{k: matplotlib.rcParams['figure.subplot.' + k]
+                               for k in ['left', 'right', 'bottom', 'top', 'wspace', 'hspace']})
+    return _figure
+
+
+def score_summary(q_list, students):
+    """
+    Calculate the score statistics needed for the plots.
+
+    :param q_list: the list of questions
+    :type q_list: list of strs
+    :param students: the students, as returned by read_results
+    :type students: list of dicts
+    :return: the scores, the response matrix, average, KR-20 and standard error of measurement
+    :rtype: dict
+
+    """
+    scores = np.array([s['score'] for s in students], dtype=float)
+    responses = np.array([s['responses'] for s in students], dtype=str).reshape(len(students), len(q_list))
+
+    avg = scores.mean() if len(scores) else 0.0
+    sig = scores.std(ddof=1) if len(scores) > 1 else 0.0
+    answered = np.isin(responses, OPTIONS).sum(axis=0)
+    d = (responses == '1').sum(axis=0)/np.maximum(answered, 1)
+    r20 = kr20(len(q_list), (d*(1 - d)).sum(), sig**2)
+    stderr = sig*math.sqrt(max(1 - r20, 0))
+
+    return {'scores': scores, 'responses': responses, 'avg': avg, 'kr20': r20, 'stderr': stderr}
+
+
+def plot_scores(fig, name, n_q, summary):
+    """
+    Draw the score histogram and boxplot.
+
+    :param fig: the figure
+    :type fig: matplotlib.figure.Figure
+    :param name: the title
+    :type name: str
+    :param n_q: the number of questions
+    :type n_q: int
+    :param summary: the score statistics, as returned by score_summary
+    :type summary: dict
+
+    """
+    scores = summary['scores']
+    avg = summary['avg']
+    stderr = summary['stderr']
+    lab = "{} Questions, {} Students".format(n_q, len(scores))
+    bins = np.arange(n_q + 2) - 0.5
+
+    fig.set_size_inches(6.4, 4.8)
+    ax_hist, ax_box = fig.subplots(nrows=2, sharex='col', gridspec_kw={"height_ratios": (.9, .1)})
+
+    sns.boxplot(x=scores, ax=ax_box, showmeans=True, notch=True, orient="h")
+    sns.histplot(scores, bins=bins, ax=ax_hist, stat='density', kde=True, label=lab)
+
+    ax_hist.set(xlim=[-0.5, n_q+0.5])
+    ax_box.set(yticks=[])
+    ax_hist.axvline(x=avg, alpha=0.3, color='red')
+    ax_hist.axvspan(avg-0.5*stderr, avg+0.5*stderr, alpha=0.15, color='red')
+    ax_hist.grid()
+    ax_box.grid()
+    fig.subplots_adjust(wspace=0, hspace=0)
+
+    ax_hist.legend()
+    fig.suptitle(name)
+
+
+def plot_items(fig, name, q_list, summary, ngroups=5, ncols=5):
+    """
+    Draw the option curves: for each question, the fraction of students choosing each option in
+    each score group (equal sized groups, from lowest to highest score).
+
+    :param fig: the figure
+    :type fig: matplotlib.figure.Figure
+    :param name: the title
+    :type name: str
+    :param q_list: the list of questions
+    :type q_list: list of strs
+    :param summary: the score statistics, as returned by score_summary
+    :type summary: dict
+    :param ngroups: number of score groups
+    :type ngroups: int
+    :param ncols: number of columns of plots
+    :type ncols: int
+
+    """
+    order = np.argsort(summary['scores'], kind='stable')
+    groups = [g for g in np.array_split(order, ngroups) if len(g)]
+    x = np.arange(1, len(groups) + 1)
+
+    "Fraction choosing each option, shape (options, groups, questions)"
+    frac = np.array([[(summary['responses'][g] == o).mean(axis=0) for g in groups] for o in OPTIONS])
+
+    nrows = math.ceil(len(q_list)/ncols)
+    fig.set_size_inches(2.4*ncols, 2.0*nrows + 0.6)
+    axes = fig.subplots(nrows=nrows, ncols=ncols, sharex=True, sharey=True, squeeze=False).flatten()
+    for q, qn in enumerate(q_list):
+        ax = axes[q]
+        for o, lab in enumerate(LABELS):
+            ax.plot(x, frac[o, :, q], marker='.', lw=2.0 if o == 0 else 1.0, label=lab)
+        ax.set_title(qn, fontsize='small')
+        ax.set(ylim=[0, 1], xticks=x)
+        ax.grid()
+    for ax in axes[len(q_list):]:
+        ax.set_axis_off()
+
+    axes[0].legend(fontsize='x-small')
+    fig.suptitle(name)
+    fig.tight_layout()
+
+
+def plot_file(fname, out_dir, formats=('png',), nskip=0):
+    """
+    Write the figures for one result file.
+
+    :param fname: the result file (csv format)
+    :type fname: str
+    :param out_dir: the directory to write the figures
+    :type out_dir: str
+    :param formats: the file formats
+    :type formats: list of strs
+    :param nskip: number of leading questions to skip
+    :type nskip: int
+    :return: the files written
+    :rtype: list of strs
+
+    """
+    with open(fname, 'r', newline='') as f:
+        q_list, students = read_results(f, nskip)
+    name = os.path.splitext(os.path.basename(fname))[0]
+    summary = score_summary(q_list, students)
+
+    written = []
+    for kind, draw in [('scores', lambda fig: plot_scores(fig, name, len(q_list), summary)),
+                       ('items', lambda fig: plot_items(fig, name, q_list, summary))]:
+        fig = get_figure()
+        draw(fig)
+        for fmt in formats:
+            outfile = os.path.join(out_dir, '{}_{}.{}'.format(name, kind, fmt))
+            fig.savefig(outfile)
+            written.append(outfile)
+    return written
+
+
+if __name__ == "__main__":
+    import argparse
+    from concurrent.futures import ProcessPoolExecutor
+
+    "Create the parser"
+    parser = argparse.ArgumentParser(description='Plot exam results to files')
+    parser.add_argument('files', nargs='+', help='Normalized exam result files (csv format)')
+    parser.add_argument('--out_dir', default='.', help='Directory to write the figures')
+    parser.add_argument('--format', nargs='+', default=['png'], choices=['png', 'pdf', 'svg'],
+                        help='Figure file formats')
+    parser.add_argument('--nskip', type=int, default=0, help='Number to skip')
+    parser.add_argument('--jobs', type=int, default=None, help='Number of processes (default: number of cpus)')
+    args = parser.parse_args()
+
+    "The figures are named from the file name, so the names must differ"
+    names = {}
+    for fname in args.files:
+        names.setdefault(os.path.splitext(os.path.basename(fname))[0], []).append(fname)
+    duplicates = [files for files in names.values() if len(files) > 1]
+    if duplicates:
+        parser.error('Files would write the same figures: {}'.format('; '.join(', '.join(d) for d in duplicates)))
+
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {pool.submit(plot_file, fname, args.out_dir, args.format, args.nskip): fname for fname in args.files}
+        for future, fname in futures.items():
+            try:
+                for outfile in future.result():
+                    print('Wrote {}'.format(outfile))
+            except Exception as err:
+                print('Error plotting {}: {}'.format(fname, err))
+                failed += 1
+
+    if failed:
+        raise SystemExit(1)
@@ -6,55 +6,161 @@ utility stuff...
 """
 import os
 import runpy
+import functools
+import threading
+import contextlib
+import contextvars
 import jinja2
+from examtex.config import validate_config
+
+
+TEMPLATE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../templates'))
 
 
 class JinjaEnv(object):
     """
-    Singleton instance of jinja2 environment, configured for latex.
+    Jinja2 environment configured for latex, one instance per template directory.
+
+    The instances are kept in a registry, so JinjaEnv(template_dir) returns the same environment (and
+    its compiled templates) every time within a process. Creating an environment is guarded by a lock
+    and rendering is thread-safe, so instances can be shared by a thread pool. An instance pickles as
+    its template directory, so in a process pool each worker uses its own registry.
+
+    get_template() and from_string() are shortcuts for those of the environment; the templates made
+    from strings (without globals) are cached, so they are compiled once.
+
+    Without a template directory, the one set with JinjaEnv.using() is used, otherwise the default
+    templates directory. That setting is not inherited by the workers of a thread or process pool;
+    submit work with JinjaEnv.submit() to carry it over.
+
+    If the EXAMTEX_BYTECODE_CACHE environment variable is set, the compiled templates are also cached
+    in that directory, shared by all environments and processes.
+
+    :param template_dir: path to the template directory, optional
+    :type template_dir: str or None
 
     """
-    __instance = None
-
-    def __new__(cls):
-        if JinjaEnv.__instance is None:
-            JinjaEnv.__instance = object.__new__(cls)
-            JinjaEnv.__instance.env = jinja2.Environment(
-                block_start_string=r'\BLOCK{',
-                block_end_string='}',
-                variable_start_string=r'\VAR{',
-                variable_end_string='}',
-                comment_start_string=r'\#{',
-                comment_end_string='}',
-                line_statement_prefix='%%',
-                line_comment_prefix='%#',
-                trim_blocks=True,
-                autoescape=False,
-                loader=jinja2.FileSystemLoader(os.path.join(os.path.dirname(__file__), '../templates'))
-            )
-
-        return JinjaEnv.__instance
+    _registry = {}
+    _bytecode_caches = {}
+    _lock = threading.Lock()
+    _current = contextvars.ContextVar('examtex_template_dir', default=None)
+
+    def __new__(cls, template_dir=None):
+        template_dir = os.path.abspath(template_dir or cls._current.get() or TEMPLATE_DIR)
+
+        instance = cls._registry.get(template_dir)
+        if instance is None:
+            with cls._lock:
+                instance = cls._registry.get(template_dir)
+                if instance is None:
+                    instance = object.__new__(cls)
+                    instance.template_dir = template_dir
+                    instance.env = jinja2.Environment(
+                        block_start_string=r'\BLOCK{',
+                        block_end_string='}',
+                        variable_start_string=r'\VAR{',
+                        variable_end_string='}',
+                        comment_start_string=r'\#{',
+                        comment_end_string='}',
+                        line_statement_prefix='%%',
+                        line_comment_prefix='%#',
+                        trim_blocks=True,
+                        autoescape=False,
+                        loader=jinja2.FileSystemLoader(template_dir),
+                        bytecode_cache=cls._bytecode_cache()
+                    )
+                    instance._from_string = functools.lru_cache(maxsize=1024)(instance.env.from_string)
+                    cls._registry[template_dir] = instance
+
+        return instance
+
+    def __reduce__(self):
+        return JinjaEnv, (self.template_dir,)
+
+    def get_template(self, name, parent=None, globals=None):
+        """
+        Shortcut for jinja2.Environment.get_template.
+        """
+        return self.env.get_template(name, parent, globals)
+
+    def from_string(self, source, globals=None, template_class=None):
+        """
+        Shortcut for jinja2.Environment.from_string, cached when only the source is given.
+        """
+        if globals is None and template_class is None:
+            return self._from_string(source)
+        return self.env.from_string(source, globals, template_class)
+
+    @classmethod
+    def _bytecode_cache(cls):
+        """
+        Get the shared bytecode cache, if one is configured. Must be called with the lock held.
+
+        :return: the bytecode cache
+        :rtype: jinja2.FileSystemBytecodeCache or None
+
+        """
+        directory = os.environ.get('EXAMTEX_BYTECODE_CACHE')
+        if not directory:
+            return None
+        if directory not in cls._bytecode_caches:
+            os.makedirs(directory, exist_ok=True)
+            cls._bytecode_caches[directory] = jinja2.FileSystemBytecodeCache(directory)
+        return cls._bytecode_caches[directory]
+
+    @classmethod
+    @contextlib.contextmanager
+    def using(cls, template_dir):
+        """
+        Use a template directory for JinjaEnv() calls without one, within a with block. The setting
+        is local to the current thread (or task), so different courses can be rendered concurrently.
+        Pool workers do not inherit it, see JinjaEnv.submit().
+
+        :param template_dir: path to the template directory, None for the default
+        :type template_dir: str or None
+
+        """
+        token = cls._current.set(template_dir)
+        try:
+            yield cls(template_dir)
+        finally:
+            cls._current.reset(token)
+
+    @classmethod
+    def submit(cls, executor, fn, *args, **kwargs):
+        """
+        Submit work to a thread or process pool, using the template directory in use here (set with
+        JinjaEnv.using()) for the JinjaEnv() calls in the worker.
+
+        :param executor: the pool
+        :type executor: concurrent.futures.Executor
+        :param fn: the function to call, must be picklable for a process pool
+        :type fn: callable
+        :return: the future
+        :rtype: concurrent.futures.Future
+
+        """
+        return executor.submit(_run_using, cls._current.get(), fn, *args, **kwargs)
+
+
+def _run_using(template_dir, fn, *args, **kwargs):
+    with JinjaEnv.using(template_dir):
+        return fn(*args, **kwargs)
 
 
 def check_config(cfg):
     """
-    Check to make sure that the configuration has all the required keys.
+    Check to make sure that the configuration is valid, printing any problems found.
 
     :param cfg: the configuration
     :type cfg: dict
+    :return: True if the configuration is valid
+    :rtype: bool
     """
-    required = ['question_dir', 'docopts', 'head_foot', 'front',
-                'exam_dir', 'course', 'semester', 'exam', 'versions', 'num_per_page']
-
-    missing = []
-    for k in required:
-        if k not in cfg:
-            missing.append(k)
-
-    if missing:
-        print("Configuration is missing the following keys: {}".format(missing))
-        return False
-    return True
+    errors = validate_config(cfg)
+    for err in errors:
+        print(err)
+    return not errors
 
 
 class QuestionFactory(object):
@@ -109,7 +215,7 @@ def si(value, unit=None, opts=None):
     >>> print(si(1/8, unit=r'\meter', opts=r'round-mode=figures, round-precision=2'))
     \\qty[round-mode=figures, round-precision=2]{0.125}{\meter}
     """
-    env = JinjaEnv().env
+    env = JinjaEnv()
 
     if isinstance(opts, list):
         opts = ','.join(opts)
@@ -139,7 +245,7 @@ def render(template, **kwargs):
     :rtype: str
 
     """
-    return JinjaEnv().env.from_string(template).render(kwargs)
+    return JinjaEnv().from_string(template).render(kwargs)
 
 
 def render_question(**kwargs):
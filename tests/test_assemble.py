@@ -0,0 +1,55 @@
+from examtex.assemble import Assembler, count_choices, exam_config
+from examtex.config import validate_config
+
+QUESTION = """from examtex.util import render_question, permute
+
+
+def make(version, pts=None, permutation=None):
+    choices = {choices!r}
+    correct = 0
+    if permutation:
+        choices, correct = permute(choices, permutation)
+    return render_question(pts=pts, qtext='Pick one', choices=choices, correct=correct)
+"""
+
+
+def test_min_kr20_is_a_constraint():
+    "On target but weakly discriminating, or off target and strongly discriminating"
+    d = [0.7]*50 + [0.5]*50
+    r = [0.35]*50 + [0.6]*50
+    assembler = Assembler([str(i) for i in range(100)], d, r, weight=5.0)
+
+    free = assembler.report(assembler.select(10, 0.7), 0.7)
+    assert free['kr20'] < 0.7
+
+    constrained = assembler.report(assembler.select(10, 0.7, min_kr20=0.7), 0.7)
+    assert constrained['kr20'] >= 0.7
+
+
+def test_topic_coverage():
+    topics = [{'a'}]*5 + [{'b'}]*95
+    assembler = Assembler([str(i) for i in range(100)], [0.7]*100, [0.2]*5 + [0.5]*95, topics=topics)
+    chosen = assembler.select(10, 0.7, cover={'a': 3})
+    assert sum(i < 5 for i in chosen) >= 3
+    assert not assembler.report(chosen, 0.7, cover={'a': 3})['missing']
+
+
+def test_exam_config_uses_choices_and_versions(tmp_path):
+    (tmp_path / 'q004.py').write_text(QUESTION.format(choices=['a', 'b', 'c', 'd']))
+    (tmp_path / 'q005.py').write_text(QUESTION.format(choices=['a', 'b', 'c', 'd', 'e']))
+
+    nchoices = {q: count_choices(str(tmp_path), q) for q in ['004', '005']}
+    assert nchoices == {'004': 4, '005': 5}
+
+    cfg = exam_config(['004', '005'], qversions={'005': 2}, nchoices=nchoices, course='PH102')
+    questions = cfg['versions'][0]['questions']
+    assert questions[0] == {'qid': '004', 'pts': 1, 'version': 0, 'perm': [0, 1, 2, 3]}
+    assert questions[1]['version'] == 2
+    errors = validate_config({'question_dir': str(tmp_path), **cfg})
+    assert all(e.startswith('Configuration is missing') for e in errors)
+
+
+def test_count_choices_falls_back_to_options_chosen(tmp_path):
+    (tmp_path / 'q006.py').write_text('raise RuntimeError("broken")\n')
+    stats = {'n_a': 10, 'n_b': 3, 'n_c': 1, 'n_d': 0, 'n_e': 0}
+    assert count_choices(str(tmp_path), '006', stats=stats) == 3
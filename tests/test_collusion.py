@@ -0,0 +1,73 @@
+import math
+import random
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pytest
+from examtex.collusion import WRONG, init_worker, response_matrices, screen, screen_block
+
+
+def random_responses(n_students=60, n_questions=21, seed=7):
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(n_students):
+        ability = rng.random()
+        rows.append(['1' if rng.random() < ability else rng.choice('22345') for _ in range(n_questions)])
+    "One copier, and a blank"
+    rows[40] = [a if rng.random() < 0.8 else b for a, b in zip(rows[10], rows[40])]
+    rows[5][3] = ' '
+    return np.array(rows, dtype=str)
+
+
+def brute_force(responses):
+    """
+    Score every pair directly.
+    """
+    n_wrong = np.isin(responses, WRONG).sum(axis=0)
+    m = [sum(((responses[:, q] == o).sum()/n_wrong[q])**2 for o in WRONG) if n_wrong[q] else 0.0
+         for q in range(responses.shape[1])]
+    pairs = {}
+    for i in range(len(responses)):
+        for j in range(i + 1, len(responses)):
+            shared = both = 0
+            expected = var = 0.0
+            for q, (a, b) in enumerate(zip(responses[i], responses[j])):
+                if a in WRONG and b in WRONG:
+                    both += 1
+                    expected += m[q]
+                    var += m[q]*(1 - m[q])
+                    shared += a == b
+            z = (shared - expected)/math.sqrt(var) if var > 0 else 0.0
+            pairs[i, j] = (z, shared, expected, both)
+    return pairs
+
+
+def test_screen_block_matches_brute_force():
+    responses = random_responses()
+    expected = brute_force(responses)
+    init_worker(response_matrices(responses))
+
+    n = len(responses)
+    found = screen_block(0, n, n*n)
+    assert len(found) == len([p for p in expected.values() if p[1] >= 1])
+    for z, i, j, shared, exp, both in found:
+        assert (shared, both) == (expected[i, j][1], expected[i, j][3])
+        assert exp == pytest.approx(expected[i, j][2])
+        assert z == pytest.approx(expected[i, j][0])
+
+
+def test_screen_blocks_and_pool_agree():
+    responses = random_responses()
+    best = sorted(brute_force(responses).items(), key=lambda p: -p[1][0])[:5]
+
+    "A tiny block size forces many blocks"
+    found = screen(responses, top=5, block_bytes=64)
+    assert [(i, j) for z, i, j, *rest in found] == [pair for pair, _ in best]
+    assert (found[0][1], found[0][2]) == (10, 40)
+
+    with ProcessPoolExecutor(2, initializer=init_worker, initargs=(response_matrices(responses),)) as pool:
+        assert screen(responses, top=5, block_bytes=64, pool=pool) == found
+
+
+@pytest.mark.parametrize('n', [0, 1])
+def test_screen_too_few_students(n):
+    assert screen(np.full((n, 4), '2', dtype=str), 10, 1) == []
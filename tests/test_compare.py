@@ -0,0 +1,111 @@
+import io
+import csv
+import random
+import pytest
+from examtex.compare import chi2_sf, homogeneity, compare
+from examtex.itemstats import ItemStats, new_sums, add_sums, item_sums, read_results
+from examtex.normalize import question_map, normalize_student
+
+CONFIG = {
+    'course': 'PH102',
+    'semester': 'Fall 2022',
+    'exam': 'Exam 1',
+    'versions': [
+        {'version': 'A', 'order': ['001', '002', '003'],
+         'questions': [{'qid': '001', 'version': 0, 'perm': [0, 1, 2, 3]},
+                       {'qid': '002', 'version': 0, 'perm': [0, 1, 2, 3]},
+                       {'qid': '003', 'version': 0, 'perm': [0, 1, 2, 3]}]},
+        {'version': 'B', 'order': ['003', '001', '002'],
+         'questions': [{'qid': '001', 'version': 0, 'perm': [1, 0, 3, 2]},
+                       {'qid': '002', 'version': 0, 'perm': [2, 3, 0, 1]},
+                       {'qid': '003', 'version': 0, 'perm': [3, 2, 1, 0]}]},
+    ],
+}
+
+
+def raw_results(cfg, vi, n_students=100, seed=1):
+    """
+    Write a raw result file for version vi: the key row, then students with random responses.
+    """
+    rng = random.Random(seed + vi)
+    v = cfg['versions'][vi]
+    perms = {q['qid']: q['perm'] for q in v['questions']}
+    n = len(v['order'])
+
+    f = io.StringIO(newline='')
+    writer = csv.writer(f)
+    writer.writerow(['CWID', 'Mybama ID', 'Student Name', 'Raw Score', 'Extra'] + [str(i + 1) for i in range(n)])
+    key = [str(perms[q].index(0) + 1) for q in v['order']]
+    writer.writerow(['', '', 'KEY', str(n), ''] + key)
+    for s in range(n_students):
+        responses = [k if rng.random() < 0.6 else str(rng.randint(1, 4)) for k in key]
+        score = sum(a == k for a, k in zip(responses, key))
+        writer.writerow([str(s), 'm{}'.format(s), 'S{}'.format(s), str(score), ''] + responses)
+    return f.getvalue()
+
+
+def test_chi2_sf():
+    assert chi2_sf(3.841, 1) == pytest.approx(0.05, abs=1e-4)
+    assert chi2_sf(5.991, 2) == pytest.approx(0.05, abs=1e-4)
+    assert chi2_sf(7.815, 3) == pytest.approx(0.05, abs=1e-4)
+    assert chi2_sf(13.277, 4) == pytest.approx(0.01, abs=1e-4)
+    assert chi2_sf(0.0, 3) == 1.0
+
+
+def test_homogeneity():
+    def sums(n, n_a):
+        s = new_sums(['q'])['q']
+        s['n'], s['n_a'] = n, n_a
+        return s
+
+    chi2, df, p = homogeneity([sums(100, 80), sums(100, 40)])
+    assert df == 1 and p < 0.001
+    assert chi2 == pytest.approx(200*(80*60 - 20*40)**2/(120*80*100*100))
+
+    assert homogeneity([sums(100, 50), sums(200, 100)]) == (0.0, 1, 1.0)
+    assert homogeneity([sums(100, 100), sums(100, 100)])[2] == 1.0
+    assert homogeneity([sums(100, 70), sums(0, 0)]) == (0.0, 0, 1.0)
+
+
+def test_compare_pools_like_normalize():
+    contents = [raw_results(CONFIG, vi) for vi in range(2)]
+    q_list, version_sums = compare(CONFIG, [io.StringIO(c, newline='') for c in contents])
+
+    "Normalize the files as normalize.py does, then read the normalized results"
+    questions, n_skipped = question_map(CONFIG)
+    out = io.StringIO(newline='')
+    writer = csv.writer(out)
+    writer.writerow(['CWID', 'Mybama ID', 'Student Name', 'Raw Score', 'Extra'] + q_list)
+    for vi, c in enumerate(contents):
+        reader = csv.DictReader(io.StringIO(c, newline=''))
+        key = next(reader)
+        for student in reader:
+            norm = normalize_student(student, key, questions, q_list, vi, n_skipped)
+            writer.writerow([norm['CWID'], norm['Mybama ID'], norm['Student Name'], norm['Raw Score'], '']
+                            + [norm[q] for q in q_list])
+    out.seek(0)
+    expected = item_sums(*read_results(out))
+
+    for q in q_list:
+        assert add_sums(version_sums[0][q], version_sums[1][q]) == expected[q]
+
+
+def test_update_refuses_other_kind(tmp_path):
+    contents = [raw_results(CONFIG, vi) for vi in range(2)]
+    q_list, version_sums = compare(CONFIG, [io.StringIO(c, newline='') for c in contents])
+    pooled = {q: add_sums(version_sums[0][q], version_sums[1][q]) for q in q_list}
+
+    with ItemStats(str(tmp_path / 'items.db')) as stats:
+        assert stats.update(pooled, 'PH102', 'Fall 2022', 'Exam 1', source='norm.csv', digest='norm')
+        with pytest.raises(ValueError):
+            stats.update(version_sums[0], 'PH102', 'Fall 2022', 'Exam 1', source='a.csv', digest='a', kind='raw')
+        assert stats.summary(['001'])['001']['n'] == 200
+        assert not stats.has_source('a')
+
+        "Another sitting may be loaded from the raw files"
+        for vi, sums in enumerate(version_sums):
+            assert stats.update(sums, 'PH102', 'Spring 2023', 'Exam 1', digest=str(vi), kind='raw')
+        with pytest.raises(ValueError):
+            stats.update(pooled, 'PH102', 'Spring 2023', 'Exam 1', digest='norm2')
+        assert stats.summary(['001'])['001']['n'] == 400
+
@@ -0,0 +1,120 @@
+import copy
+import pytest
+from examtex.config import load_yaml, validate_config
+
+QUESTION = "def make(version, pts=None, permutation=None):\n    return ''\n"
+
+
+@pytest.fixture
+def cfg(tmp_path):
+    for qid in ['000', '001']:
+        (tmp_path / 'q{}.py'.format(qid)).write_text(QUESTION)
+    return {
+        'question_dir': str(tmp_path),
+        'docopts': ['12pt'],
+        'head_foot': '',
+        'front': '',
+        'exam_dir': str(tmp_path),
+        'course': 'xx101',
+        'semester': 'Fall 2022',
+        'exam': 'Exam 3',
+        'num_per_page': None,
+        'versions': [
+            {'version': 'AA', 'order': ['000', '001'],
+             'questions': [{'qid': '000', 'version': 0},
+                           {'qid': '001', 'pts': 1, 'version': 0, 'perm': [0, 1, 2, 3, 4]}]},
+            {'version': 'BA', 'order': ['001', 'np', '000'],
+             'questions': [{'qid': '000', 'version': 1},
+                           {'qid': '001', 'pts': 1, 'version': 1, 'perm': [1, 2, 3, 4, 0]}]},
+        ],
+    }
+
+
+def question(cfg, vi=0, qi=1):
+    return cfg['versions'][vi]['questions'][qi]
+
+
+def test_valid(cfg):
+    assert validate_config(cfg) == []
+
+
+def test_missing_keys(cfg):
+    del cfg['front']
+    del cfg['exam']
+    errors = validate_config(cfg)
+    assert len(errors) == 1
+    assert "['front', 'exam']" in errors[0]
+
+
+def test_missing_question_version(cfg):
+    del question(cfg)['version']
+    assert validate_config(cfg) == ["version 'AA', question '001': missing version"]
+
+
+@pytest.mark.parametrize('perm', [[0, 1, 1, 3, 4], [1, 2, 3, 4, 5], [True, 0, 2, 3, 4], '01234', [0.0, 1, 2]])
+def test_bad_perm(cfg, perm):
+    question(cfg)['perm'] = perm
+    errors = validate_config(cfg)
+    assert len(errors) == 1
+    assert 'perm must be a permutation' in errors[0]
+
+
+@pytest.mark.parametrize('key, value', [('version', -1), ('version', True), ('version', '1'), ('pts', -1), ('qid', 1)])
+def test_bad_question_values(cfg, key, value):
+    question(cfg)[key] = value
+    assert len(validate_config(cfg)) >= 1
+
+
+def test_order_and_duplicates(cfg):
+    cfg['versions'][0]['order'].append('178')
+    cfg['versions'][1]['version'] = 'AA'
+    cfg['versions'][1]['questions'].append(copy.deepcopy(question(cfg, 1, 0)))
+    errors = validate_config(cfg)
+    assert "version 'AA': order entry '178' is not in questions" in errors
+    assert "version 'AA': duplicate version name" in errors
+    assert "version 'AA': question '000' appears more than once" in errors
+
+
+def test_missing_files_and_dirs(cfg, tmp_path):
+    (tmp_path / 'q001.py').unlink()
+    cfg['template_dir'] = str(tmp_path / 'nope')
+    errors = validate_config(cfg)
+    assert 'question file {} does not exist'.format(tmp_path / 'q001.py') in errors
+    assert 'template_dir {} does not exist'.format(tmp_path / 'nope') in errors
+
+
+def test_all_problems_reported_at_once(cfg):
+    cfg['num_per_page'] = 0
+    cfg['semester'] = 'Fall'
+    cfg['versions'][1]['questions'][1]['perm'] = [0, 0]
+    assert len(validate_config(cfg)) == 3
+
+
+def test_load_yaml_cache(tmp_path):
+    path = tmp_path / 'exam.yml'
+    path.write_text("course: xx101\nversions: []\n")
+    first = load_yaml(str(path))
+    first['course'] = 'changed'
+    assert load_yaml(str(path))['course'] == 'xx101'
+
+    path.write_text("course: PH102 Honors\nversions: []\n")
+    assert load_yaml(str(path))['course'] == 'PH102 Honors'
+
+
+@pytest.mark.parametrize('change', [
+    lambda cfg: question(cfg).update(qid=['001']),
+    lambda cfg: cfg['versions'][0].update(version=['AA']),
+    lambda cfg: cfg['versions'][0].update(order=[['000', '001']]),
+])
+def test_unhashable_entries_are_reported(cfg, change):
+    change(cfg)
+    assert len(validate_config(cfg)) >= 1
+
+
+def test_not_a_mapping(tmp_path):
+    assert validate_config(['course']) == ['Configuration must be a mapping, got list']
+
+    path = tmp_path / 'exam.yml'
+    path.write_text("- course\n- versions\n")
+    with pytest.raises(ValueError):
+        load_yaml(str(path))
@@ -0,0 +1,91 @@
+import os
+import csv
+import sys
+import random
+import subprocess
+import pytest
+from examtex.itemstats import ItemStats, read_results, item_sums, item_summary, term_key
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+ANALYZE = os.path.join(ROOT, 'examtex', 'analyze.py')
+
+
+def write_results(path, n_students=200, q_list=('001', '002', '003', '004'), seed=1):
+    """
+    Write a normalized result file with random responses, correct more often for better students.
+    """
+    rng = random.Random(seed)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['CWID', 'Mybama ID', 'Student Name', 'Raw Score', 'Extra'] + list(q_list))
+        for i in range(n_students):
+            ability = rng.random()
+            responses = ['1' if rng.random() < ability else str(rng.randint(2, 5)) for _ in q_list]
+            writer.writerow([str(i), 'm{}'.format(i), 'S{}'.format(i), '0', ''] + responses)
+    return path
+
+
+def load(path):
+    with open(path, newline='') as f:
+        q_list, students = read_results(f)
+    return item_sums(q_list, students)
+
+
+def test_item_summary_matches_analyze(tmp_path):
+    path = write_results(tmp_path / 'norm.csv')
+    sums = load(path)
+
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join([ROOT, os.environ.get('PYTHONPATH', '')])}
+    out = subprocess.run([sys.executable, ANALYZE, str(path)], capture_output=True, text=True, check=True,
+                         env=env).stdout
+    lines = [line for line in out.splitlines() if line[:6].strip() in sums]
+    assert len(lines) == len(sums)
+    for line in lines:
+        qn = line[:6].strip()
+        pct, cor = line.split('|')[1].split()
+        summary = item_summary(sums[qn])
+        assert summary['n'] == int(line[6:10])
+        assert 100*summary['d'] == pytest.approx(float(pct.rstrip('%')), abs=0.05)
+        assert summary['r'] == pytest.approx(float(cor), abs=0.0005)
+
+
+def test_update_skips_loaded_digest(tmp_path):
+    sums = load(write_results(tmp_path / 'norm.csv'))
+    with ItemStats(str(tmp_path / 'items.db')) as stats:
+        assert stats.update(sums, 'PH102', 'Fall 2022', 'Exam 1', source='norm.csv', digest='abc')
+        assert not stats.update(sums, 'PH102', 'Fall 2022', 'Exam 1', source='norm.csv', digest='abc')
+        assert stats.summary(['001'])['001']['n'] == 200
+
+        "A different section of the same exam is accumulated"
+        assert stats.update(sums, 'PH102', 'Fall 2022', 'Exam 1', source='norm2.csv', digest='def')
+        assert stats.summary(['001'])['001']['n'] == 400
+
+
+def test_summary_combines_sittings(tmp_path):
+    sums = load(write_results(tmp_path / 'norm.csv'))
+    one = item_summary(sums['001'])
+
+    "Same item, but the second sitting has total scores shifted by a longer exam"
+    shifted = dict(sums['001'])
+    shifted['sum_xs'] += 50*shifted['n_a']
+    shifted['sum_s2'] += 100*shifted['sum_s'] + 2500*shifted['n']
+    shifted['sum_s'] += 50*shifted['n']
+    assert item_summary(shifted)['r'] == pytest.approx(one['r'])
+
+    with ItemStats(str(tmp_path / 'items.db')) as stats:
+        stats.update({'001': sums['001']}, 'PH102', 'Fall 2022', 'Exam 1')
+        stats.update({'001': shifted}, 'PH102', 'Spring 2023', 'Exam 1')
+        summary = stats.summary()['001']
+    assert summary['n'] == 2*one['n']
+    assert summary['d'] == pytest.approx(one['d'])
+    assert summary['r'] == pytest.approx(one['r'])
+
+
+def test_history_is_chronological(tmp_path):
+    sums = load(write_results(tmp_path / 'norm.csv'))
+    with ItemStats(str(tmp_path / 'items.db')) as stats:
+        for semester in ['Fall 2023', 'Spring 2022', 'Fall 2022', 'Spring 2023']:
+            stats.update(sums, 'PH102', semester, 'Exam 1')
+        history = stats.history('001')
+    assert [h['semester'] for h in history] == ['Spring 2022', 'Fall 2022', 'Spring 2023', 'Fall 2023']
+    assert term_key('Summer 2022') < term_key('Fall 2022')
@@ -0,0 +1,29 @@
+import csv
+import pytest
+from examtex.plot import score_summary, plot_file
+from examtex.itemstats import kr20
+
+
+def test_kr20_single_question():
+    assert kr20(1, 0.25, 0.25) == 0.0
+    assert kr20(10, 2.0, 0.0) == 0.0
+    assert kr20(10, 2.0, 4.0) == pytest.approx(10/9*0.5)
+
+
+def test_score_summary_single_question():
+    students = [{'score': s, 'responses': [r]} for s, r in [(1, '1'), (0, '2'), (1, '1')]]
+    summary = score_summary(['001'], students)
+    assert summary['kr20'] == 0.0
+    assert summary['stderr'] == pytest.approx(summary['scores'].std(ddof=1))
+
+
+def test_plot_file_writes_figures(tmp_path):
+    path = tmp_path / 'one.csv'
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['CWID', 'Mybama ID', 'Student Name', 'Raw Score', 'Extra', '001'])
+        writer.writerows([[i, '', 'S{}'.format(i), 0, '', '1' if i % 2 else '3'] for i in range(3)])
+
+    written = plot_file(str(path), str(tmp_path), ['png', 'pdf'])
+    assert len(written) == 4
+    assert all((tmp_path / f).stat().st_size > 0 for f in written)
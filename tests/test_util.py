@@ -0,0 +1,64 @@
+import os
+import pickle
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from examtex.util import JinjaEnv, TEMPLATE_DIR, render, render_question, permute
+
+
+@pytest.fixture
+def custom_dir(tmp_path):
+    (tmp_path / 'question.tex').write_text(r'CUSTOM \VAR{qtext}')
+    return str(tmp_path)
+
+
+def test_registry(custom_dir):
+    assert JinjaEnv() is JinjaEnv(TEMPLATE_DIR)
+    assert JinjaEnv(custom_dir) is JinjaEnv(custom_dir)
+    assert JinjaEnv(custom_dir) is not JinjaEnv()
+    assert pickle.loads(pickle.dumps(JinjaEnv(custom_dir))) is JinjaEnv(custom_dir)
+
+
+def test_from_string(custom_dir):
+    env = JinjaEnv()
+    assert env.from_string(r'\VAR{x}') is env.from_string(r'\VAR{x}')
+    assert env.from_string(r'\VAR{x}', globals={'x': 'g'}).render() == 'g'
+    assert render(r'\VAR{x}+\VAR{y}', x=1, y=2) == '1+2'
+
+
+def test_using(custom_dir):
+    with JinjaEnv.using(custom_dir) as env:
+        assert env is JinjaEnv(custom_dir)
+        assert render_question(qtext='q') == 'CUSTOM q'
+    assert 'CUSTOM' not in render_question(qtext='q')
+
+
+def test_submit_carries_template_dir(custom_dir):
+    with ThreadPoolExecutor(2) as pool:
+        with JinjaEnv.using(custom_dir):
+            plain = pool.submit(render_question, qtext='q').result()
+            carried = JinjaEnv.submit(pool, render_question, qtext='q').result()
+    assert 'CUSTOM' not in plain
+    assert carried == 'CUSTOM q'
+
+
+def test_permute():
+    assert permute(['a', 'b', 'c'], [1, 2, 0]) == (['b', 'c', 'a'], 2)
+
+
+def test_exam_render_keeps_outer_template_dir(custom_dir, tmp_path):
+    from examtex.exam import Exam
+
+    shutil.copy(os.path.join(TEMPLATE_DIR, 'exam.tex'), custom_dir)
+    qdir = tmp_path / 'questions'
+    qdir.mkdir()
+    (qdir / 'q001.py').write_text("from examtex.util import render_question\n\n\n"
+                                  "def make(version, pts=None, permutation=None):\n"
+                                  "    return render_question(qtext='q', choices=['a', 'b'], correct=0)\n")
+    version = {'version': 'A', 'order': ['001'], 'questions': [{'qid': '001', 'version': 0}]}
+    exam = Exam(question_dir=str(qdir), docopts=[], head_foot='', front='', course='xx101',
+                semester='Fall 2022', exam='Exam 1', num_per_page=None, versions=[version])
+
+    assert 'CUSTOM q' not in exam.render(version, answers=False)
+    with JinjaEnv.using(custom_dir):
+        assert 'CUSTOM q' in exam.render(version, answers=False)